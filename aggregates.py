@@ -0,0 +1,143 @@
+# aggregates.py
+
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+
+from columnar import CONVERSATIONS, read_table
+from funcs import compute_median_dialogue_lengths
+from incremental import DEFAULT_STORE_DIR, prefix_fingerprint, refresh_processed_store, load_length_stats
+from streaming_stats import StreamingStats
+
+
+AGGREGATES_DIR = "aggregates"
+AGGREGATE_COLUMNS = ["conversation_id", "successful", "dialogue_length", "median_turn_length"]
+
+# Modules whose code shapes the aggregates; editing any of them invalidates materialized aggregates
+_CODE_FILES = ["funcs.py", "columnar.py", "incremental.py", "streaming_stats.py", "aggregates.py"]
+
+
+def code_version():
+    digest = hashlib.sha256()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for name in _CODE_FILES:
+        with open(os.path.join(base_dir, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+CODE_VERSION = code_version()
+
+
+def aggregates_key(file_path, tokenizer="nltk"):
+    """
+    Key of the aggregates of the dataset's current contents: a fingerprint of the file (head, tail
+    and size), the tokenizer and the code version. Cheap enough to compute on every dashboard rerun.
+    """
+    fingerprint = prefix_fingerprint(file_path, os.path.getsize(file_path))
+    return hashlib.sha256(f"{fingerprint}\0{tokenizer}\0{CODE_VERSION}".encode("utf-8")).hexdigest()[:16]
+
+
+def _aggregates_dir(file_path, store_dir, key):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(store_dir, AGGREGATES_DIR, f"{name}-{key}")
+
+
+def compute_aggregates(conversations, length_stats=None):
+    """
+    Dashboard aggregates of the per-conversation summary frame (AGGREGATE_COLUMNS).
+    Returns (summary, median_turn_lengths): a JSON-serializable dict with totals, success counts and
+    dialogue length statistics without IQR outliers, and the median turn length per non-outlier conversation.
+    """
+    if length_stats is None:
+        length_stats = StreamingStats.from_values(
+            conversations["dialogue_length"].tolist(), conversations["conversation_id"].tolist()
+        )
+    summary = {
+        "total_conversations": len(conversations),
+        "successful_conversations": int(conversations["successful"].sum()),
+        "outlier_ids": [],
+        "upper_fence": None,
+        "avg_length": None,
+        "median_length": None,
+        "length_stats": length_stats.to_dict(),
+    }
+    if length_stats.count:
+        no_outliers = length_stats.without_outliers()
+        summary.update({
+            "outlier_ids": [int(conversation_id) for conversation_id, _ in length_stats.outliers()],
+            "upper_fence": float(length_stats.fences()[1]),
+            "avg_length": float(no_outliers.mean),
+            "median_length": float(no_outliers.median),
+        })
+    median_turn_lengths = compute_median_dialogue_lengths(
+        conversations, outlier_conversation_id=summary["outlier_ids"]
+    ).reset_index(drop=True)
+    return summary, median_turn_lengths
+
+
+class DashboardAggregates:
+    """
+    Precomputed, read-only tables for the dashboard: `summary` (see compute_aggregates),
+    `median_turn_lengths` and the small per-conversation `conversations` frame.
+    """
+
+    def __init__(self, summary, median_turn_lengths, conversations):
+        self.summary = summary
+        self.median_turn_lengths = median_turn_lengths
+        self.conversations = conversations
+
+    @property
+    def length_stats(self):
+        return StreamingStats.from_dict(self.summary["length_stats"])
+
+    @classmethod
+    def load(cls, directory):
+        with open(os.path.join(directory, "summary.json"), "r", encoding="utf-8") as f:
+            summary = json.load(f)
+        return cls(
+            summary,
+            pd.read_parquet(os.path.join(directory, "median_turn_lengths.parquet")),
+            pd.read_parquet(os.path.join(directory, "conversations.parquet")),
+        )
+
+    def save(self, directory):
+        # Written next to the final directory and renamed, so readers never see a partial result
+        tmp_dir = directory + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        with open(os.path.join(tmp_dir, "summary.json"), "w", encoding="utf-8") as f:
+            json.dump(self.summary, f)
+        self.median_turn_lengths.to_parquet(os.path.join(tmp_dir, "median_turn_lengths.parquet"), index=False)
+        self.conversations.to_parquet(os.path.join(tmp_dir, "conversations.parquet"), index=False)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+
+
+def materialize_aggregates(file_path, store_dir=DEFAULT_STORE_DIR, tokenizer="nltk", cache=None, key=None):
+    """
+    Returns the DashboardAggregates of the dataset, loading them from disk if they were already computed
+    for the same file contents, tokenizer and code version. Otherwise the processed store is refreshed
+    (incrementally, see refresh_processed_store), the aggregates are computed and written to
+    `store_dir/aggregates/`, and aggregates of older versions of the same dataset are removed.
+    """
+    key = key or aggregates_key(file_path, tokenizer)
+    directory = _aggregates_dir(file_path, store_dir, key)
+    if os.path.exists(os.path.join(directory, "summary.json")):
+        return DashboardAggregates.load(directory)
+
+    columnar_dir = refresh_processed_store(file_path, store_dir, tokenizer, cache)
+    conversations = read_table(columnar_dir, CONVERSATIONS, columns=AGGREGATE_COLUMNS)
+    summary, median_turn_lengths = compute_aggregates(conversations, load_length_stats(columnar_dir))
+    summary["key"] = key
+    aggregates = DashboardAggregates(summary, median_turn_lengths, conversations)
+    aggregates.save(directory)
+
+    parent, current = os.path.split(directory)
+    prefix = current[:-len(key)]
+    for entry in os.listdir(parent):
+        if entry.startswith(prefix) and len(entry) == len(current) and entry != current:
+            shutil.rmtree(os.path.join(parent, entry), ignore_errors=True)
+    return aggregates
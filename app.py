@@ -4,16 +4,46 @@ import altair as alt
 
 
 from funcs import *
+from token_cache import TokenCountCache
+from aggregates import aggregates_key, materialize_aggregates
+from conversation_index import ConversationReader
+from export import format_turns
+from search_index import build_search_index
+import profiling
 
 
 # ---------- Data Loading ----------
-@st.cache_data(show_spinner=False)
-def load_data():
-    df = process_conversations("dataset_conversations.txt")
-    return df
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_aggregates(key):
+    # Shared by all sessions without copying. `key` changes with the dataset contents and the code, and the
+    # aggregates for a key are kept on disk, so a server restart only reads small precomputed tables.
+    # Only the current key is kept in memory, superseded aggregates are dropped.
+    # Only lines appended since the last run are parsed, and token counts persist across restarts.
+    with TokenCountCache() as cache:
+        return materialize_aggregates("dataset_conversations.txt", cache=cache, key=key)
 
 
-df = load_data()
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_conversation_reader(key):
+    # Memory-mapped random access to single conversations, shared across sessions. Keyed like the aggregates,
+    # so a changed dataset gets a fresh reader and the replaced one is closed once no session uses it.
+    return ConversationReader("dataset_conversations.txt")
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def load_search_index(key):
+    # Inverted index of message contents, keyed like the aggregates and extended with appended conversations only
+    return build_search_index("dataset_conversations.txt")
+
+
+# With CONVERSATION_PROFILE set, every rerun of the script records a fresh trace
+if profiling.is_enabled():
+    profiling.reset()
+
+with profiling.stage("load_data"):
+    dataset_key = aggregates_key("dataset_conversations.txt")
+    aggregates = load_aggregates(dataset_key)
+    df = aggregates.conversations
 
 
 # ---------- Section Functions with HTML Anchors ----------
@@ -61,13 +91,14 @@ def show_data_processing():
 
 
 
-def show_quant_analysis(df):
+def show_quant_analysis(aggregates):
     st.markdown("<a id='quant_analysis'></a>", unsafe_allow_html=True)
     st.header("3. Quantitative Analysis")
     st.subheader("Descriptive Statistics at the first glance")
 
-    total_conversations = len(df)
-    successful_conversations = df["successful"].sum()
+    summary = aggregates.summary
+    total_conversations = summary["total_conversations"]
+    successful_conversations = summary["successful_conversations"]
     st.write(f"**Total Conversations:** {total_conversations}")
     st.write(f"**Successful Conversations:** {successful_conversations}")
 
@@ -81,14 +112,16 @@ def show_quant_analysis(df):
     ).properties()
     st.altair_chart(chart, use_container_width=True)
 
-    st.markdown("### Dialogue Length Metrics (Without Outlier)")
-    if "dialogue_length" in df.columns:
-        # Remove the outlier (assumes the max value is the outlier)
-        max_length = df["dialogue_length"].max()
-        df_no_outlier = df[df["dialogue_length"] != max_length]
-        avg_length = df_no_outlier["dialogue_length"].mean()
-        median_length = df_no_outlier["dialogue_length"].median()
+    st.markdown("### Dialogue Length Metrics (Without Outliers)")
+    if summary["avg_length"] is not None:
+        # Outliers are flagged with the IQR rule instead of assuming the max value is the outlier
+        outlier_ids = summary["outlier_ids"]
+        avg_length = summary["avg_length"]
+        median_length = summary["median_length"]
 
+        if outlier_ids:
+            st.caption(f"Excluded outlier conversations {outlier_ids} "
+                       f"(longer than {int(summary['upper_fence'])} words)")
         st.metric("Average Dialogue Length", f"{int(avg_length)} words")
         st.metric("Median Dialogue Length", f"{int(median_length)} words")
 
@@ -102,23 +135,11 @@ def show_quant_analysis(df):
         ).properties(title="Dialogue Length Metrics")
         st.altair_chart(chart2, use_container_width=True)
     else:
-        st.error("The 'dialogue_length' column is missing from the data.")
-
-    if "turn_metrics" in df.columns:
-        # Compute median of word counts per turn for each conversation
-        df["median_turn_length"] = df["turn_metrics"].apply(
-            lambda metrics: int(np.median(metrics.get("words_per_turn", []))) if metrics.get("words_per_turn",
-                                                                                             []) else 0
-        )
-    else:
-        # Fallback: if "turn_metrics" doesn't exist, use "dialogue_length"
-        # (This is less granular though.)
-        df["median_turn_length"] = df["dialogue_length"]
+        st.error("No conversations with a dialogue length in the data.")
 
     st.subheader("Median Turn Length per Conversation")
-    # Build a DataFrame with conversation id and median turn length, sorted by conversation id
-    median_df = compute_median_dialogue_lengths(df, outlier_conversation_id=0)
-    st.bar_chart(median_df.set_index("conversation_id"))
+    # Conversation id and median turn length without outliers, precomputed with the other aggregates
+    st.bar_chart(aggregates.median_turn_lengths.set_index("conversation_id"))
 
     st.markdown("""
     **Turn Balance:**
@@ -143,7 +164,7 @@ In other contexts, more detailed answers (longer turns) might be necessary to co
 It could be useful to correlate these turn metrics with other factors (e.g., user feedback or outcome measures) to see if, for example, conversations with a particular range of average turn lengths tend to be rated more highly. Also, analyzing whether longer conversations tend to be more engaging or if they sometimes indicate over-elaboration could provide deeper insights.
     """)
     # (Optional) You can also display the DataFrame as a table:
-    # st.write("Detailed median turn lengths:", median_df)
+    # st.write("Detailed median turn lengths:", aggregates.median_turn_lengths)
 
 # def show_qual_analysis():
 #     st.markdown("<a id='qual_analysis'></a>", unsafe_allow_html=True)
@@ -213,6 +234,32 @@ def show_qual_analysis():
     else:
         st.write("Conversation #17 not found in the dataset.")
 
+    reader = load_conversation_reader(dataset_key)
+
+    st.markdown("### Search Messages")
+    query = st.text_input('Search query (terms, "phrases", prefix*, -exclude, OR)', "")
+    role = st.selectbox("Role", ["All", "User", "Assistant"])
+    if query:
+        hits = load_search_index(dataset_key).search(query, role=None if role == "All" else role)
+        st.write(f"{len(hits)} matching messages in {hits['conversation_id'].nunique()} conversations.")
+        # Only the messages shown are read back from the dataset file
+        shown = hits.head(50).copy()
+        conversations = {conversation_id: reader.messages(conversation_id)
+                         for conversation_id in shown["conversation_id"].unique()}
+        shown["content"] = [
+            conversations[conversation_id][turn].get("content", "")[:300]
+            for conversation_id, turn in zip(shown["conversation_id"], shown["turn"])
+        ]
+        st.dataframe(shown, use_container_width=True)
+
+    st.markdown("### Browse a Conversation")
+    if len(reader):
+        conversation_id = st.number_input("Conversation ID", min_value=0, max_value=len(reader) - 1, value=0, step=1)
+        with st.expander(f"Conversation #{conversation_id} transcript"):
+            # Only the requested conversation is decoded from the dataset file
+            for role_display, content in format_turns(reader.messages(int(conversation_id))):
+                st.markdown(f"**{role_display}:** {content}")
+
     st.markdown("### Overall Qualitative Reflections")
     st.markdown("""
     **Thematic Insights:**  
@@ -255,6 +302,19 @@ def show_conclusions():
 
 
 # ---------- Main Function with Two Navigation Methods ----------
+def show_profiling_panel():
+    # Stage timings of this run; cached loaders show up as near-zero load_data time
+    trace = profiling.get_trace()
+    st.sidebar.header("Profiling")
+    if st.sidebar.checkbox("Show stage timings", value=True):
+        stages = pd.DataFrame(trace["stages"])
+        if not stages.empty:
+            st.sidebar.dataframe(stages.sort_values("seconds", ascending=False), hide_index=True)
+        if trace["counters"]:
+            st.sidebar.json(trace["counters"])
+    st.sidebar.caption(f"Trace saved to {profiling.export_json()}")
+
+
 def main():
     # Set the page configuration with a dark theme (you can tweak this in the config file as well)
     st.set_page_config(page_title="Conversation Analysis Report", layout="wide", initial_sidebar_state="expanded")
@@ -290,11 +350,19 @@ def main():
     except Exception as e:
         st.sidebar.error(f"Error reading system_prompt.txt: {e}")
 
-    show_introduction()
-    show_data_processing()
-    show_quant_analysis(df)
-    show_qual_analysis()
-    show_conclusions()
+    with profiling.stage("show_introduction"):
+        show_introduction()
+    with profiling.stage("show_data_processing"):
+        show_data_processing()
+    with profiling.stage("show_quant_analysis"):
+        show_quant_analysis(aggregates)
+    with profiling.stage("show_qual_analysis"):
+        show_qual_analysis()
+    with profiling.stage("show_conclusions"):
+        show_conclusions()
+
+    if profiling.is_enabled():
+        show_profiling_panel()
 
 
 
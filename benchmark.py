@@ -0,0 +1,191 @@
+# benchmark.py
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import pandas as pd
+
+from funcs import (
+    read_raw_conversations, is_successful, compute_dialogue_length, process_conversations,
+    compute_median_dialogue_lengths,
+)
+from success_heuristics import SuccessHeuristic, read_message_table
+from synthetic_data import write_dataset
+
+
+# Results of every run are appended here, so timings can be compared between commits
+DEFAULT_RESULTS_PATH = "benchmark_results.jsonl"
+DEFAULT_SIZES = [100, 1_000, 10_000]
+
+# Cold-start budget for `import funcs`: it must not pull in pandas, NLTK or the network
+DEFAULT_IMPORT_BUDGET_S = 0.2
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _stages(file_path, tokenizer):
+    """
+    Benchmark stages as (name, setup, run): `setup` prepares the input outside of the measurement,
+    `run` takes its result and does the measured work.
+    """
+    load_raw = lambda: list(read_raw_conversations(file_path))
+    return [
+        ("parse", lambda: None, lambda _: sum(1 for _ in read_raw_conversations(file_path))),
+        ("is_successful", load_raw, lambda convs: [is_successful(conv) for conv in convs]),
+        ("success_heuristic", lambda: read_message_table(file_path),
+         lambda table: SuccessHeuristic(table[0], max_last_n=5, conversation_ids=table[1]).evaluate()),
+        ("compute_dialogue_length", load_raw, lambda convs: [
+            compute_dialogue_length(conv.get("inputs", {}).get("messages", []), tokenizer) for conv in convs
+        ]),
+        ("process_conversations", lambda: None, lambda _: process_conversations(file_path, tokenizer=tokenizer)),
+        ("compute_median_dialogue_lengths", lambda: process_conversations(file_path, tokenizer=tokenizer),
+         compute_median_dialogue_lengths),
+    ]
+
+
+def _measure(setup, run, measure_memory):
+    # Pipeline functions print progress; keep the benchmark output readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = setup()
+        start = time.perf_counter()
+        run(data)
+        seconds = time.perf_counter() - start
+
+        peak_mb = None
+        if measure_memory:
+            # Separate run: tracemalloc slows allocation-heavy code down, so it must not skew the timing
+            tracemalloc.start()
+            run(data)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+    return seconds, peak_mb
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, seed=0, tokenizer="nltk", measure_memory=True, stages=None):
+    """
+    Benchmarks the analysis pipeline on seeded synthetic datasets of the given sizes.
+    Returns one record per (size, stage) with wall time, throughput, latency per conversation
+    and (optionally) peak traced memory.
+    """
+    commit = _git_commit()
+    timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    records = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for n in sizes:
+            file_path = write_dataset(os.path.join(tmp_dir, f"synthetic_{n}.jsonl"), n, seed)
+            for name, setup, run in _stages(file_path, tokenizer):
+                if stages and name not in stages:
+                    continue
+                seconds, peak_mb = _measure(setup, run, measure_memory)
+                record = {
+                    "commit": commit,
+                    "timestamp": timestamp,
+                    "python": platform.python_version(),
+                    "tokenizer": tokenizer,
+                    "seed": seed,
+                    "n_conversations": n,
+                    "stage": name,
+                    "seconds": seconds,
+                    "throughput_per_s": n / seconds if seconds else None,
+                    "latency_ms_per_conversation": 1000 * seconds / n,
+                    "peak_memory_mb": peak_mb,
+                }
+                print(f"{n:>9} {name:<32} {seconds:9.3f}s "
+                      f"{record['throughput_per_s']:12.1f} conv/s "
+                      + (f"{peak_mb:9.1f} MB" if peak_mb is not None else ""))
+                records.append(record)
+    return records
+
+
+def measure_import_time(module="funcs", repeats=5):
+    """
+    Seconds `import <module>` takes in a fresh interpreter (best of `repeats`), i.e. its cold-start cost.
+    """
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=base_dir)
+        times.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+
+def save_results(records, results_path=DEFAULT_RESULTS_PATH):
+    with open(results_path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+def load_results(results_path=DEFAULT_RESULTS_PATH):
+    return pd.read_json(results_path, lines=True, dtype={"commit": str})
+
+
+def compare_results(baseline, candidate, results_path=DEFAULT_RESULTS_PATH):
+    """
+    Compares the latest results of two commits. Returns a DataFrame per (n_conversations, stage)
+    with both timings and peak memory, and `ratio` = candidate / baseline seconds (> 1 is a regression).
+    """
+    results = load_results(results_path)
+    latest = results.sort_values("timestamp").groupby(["commit", "tokenizer", "n_conversations", "stage"]).last()
+
+    def pick(commit):
+        if commit not in latest.index.get_level_values("commit"):
+            raise ValueError(f"No benchmark results for commit {commit!r} in {results_path}")
+        return latest.xs(commit, level="commit")[["seconds", "peak_memory_mb"]]
+
+    comparison = pick(baseline).join(pick(candidate), lsuffix="_baseline", rsuffix="_candidate", how="inner")
+    comparison["ratio"] = comparison["seconds_candidate"] / comparison["seconds_baseline"]
+    return comparison.reset_index()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the conversation analysis pipeline on synthetic data.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="run the benchmark and store the results")
+    run_parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--tokenizer", default="nltk")
+    run_parser.add_argument("--stages", nargs="+")
+    run_parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory runs")
+    run_parser.add_argument("--results", default=DEFAULT_RESULTS_PATH)
+
+    compare_parser = subparsers.add_parser("compare", help="compare stored results of two commits")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate", nargs="?", default=_git_commit())
+    compare_parser.add_argument("--results", default=DEFAULT_RESULTS_PATH)
+
+    import_parser = subparsers.add_parser("import-time", help="check the cold-start import time against a budget")
+    import_parser.add_argument("--module", default="funcs")
+    import_parser.add_argument("--budget", type=float, default=DEFAULT_IMPORT_BUDGET_S, help="seconds")
+    import_parser.add_argument("--repeats", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == "import-time":
+        seconds = measure_import_time(args.module, args.repeats)
+        within = seconds <= args.budget
+        print(f"import {args.module}: {seconds * 1000:.1f} ms (budget {args.budget * 1000:.0f} ms)"
+              + ("" if within else " - over budget"))
+        sys.exit(0 if within else 1)
+    elif args.command == "run":
+        records = run_benchmark(args.sizes, args.seed, args.tokenizer, not args.no_memory, args.stages)
+        save_results(records, args.results)
+        print(f"Results appended to {args.results}")
+    else:
+        print(compare_results(args.baseline, args.candidate, args.results).to_string(index=False))
@@ -0,0 +1,170 @@
+# columnar.py
+
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+
+from funcs import TURN_METRIC_NUMERIC_COLUMNS, compute_turn_metrics_frame
+
+
+DEFAULT_STORE_DIR = "processed_conversations"
+
+CONVERSATIONS = "conversations"
+MESSAGES = "messages"
+SYSTEM_PROMPTS = "system_prompts"
+TABLES = (CONVERSATIONS, MESSAGES, SYSTEM_PROMPTS)
+
+
+def system_prompt_id(content):
+    """
+    Content-addressed id of a system prompt, stable across runs and store parts.
+    """
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def _to_json(value):
+    return None if value is None else json.dumps(value, ensure_ascii=False)
+
+
+def _from_json(value):
+    return None if value is None or pd.isna(value) else json.loads(value)
+
+
+def to_columnar_tables(df):
+    """
+    Splits a processed conversations DataFrame (as returned by process_conversations) into:
+      - conversations: one row per conversation with scalar and turn metrics (see compute_turn_metrics_frame),
+        metadata/error_info as JSON strings and the id of its system prompt
+      - messages: one row per message (conversation_id, turn, role as category, content, token_count);
+        system messages only reference their prompt through system_prompt_id
+      - system_prompts: each distinct system prompt stored once (system_prompt_id, content)
+    """
+    conversation_rows, message_rows, prompts = [], [], {}
+    for row in df.itertuples(index=False):
+        metrics = row.turn_metrics
+        word_counts = iter(metrics["words_per_turn"])
+        first_prompt_id = None
+        for turn, msg in enumerate(row.messages):
+            role = msg.get("role", "").lower()
+            content = msg.get("content", "")
+            if role == "system":
+                prompt_id = system_prompt_id(content)
+                prompts.setdefault(prompt_id, content)
+                first_prompt_id = first_prompt_id or prompt_id
+                message_rows.append((row.conversation_id, turn, role, None, prompt_id, None))
+            else:
+                message_rows.append((row.conversation_id, turn, role, content, None, next(word_counts)))
+
+        conversation_rows.append({
+            "conversation_id": row.conversation_id,
+            "metadata": _to_json(row.metadata),
+            "final_feedback": row.final_feedback,
+            "successful": bool(row.successful),
+            "error_info": _to_json(row.error_info),
+            "dialogue_length": row.dialogue_length,
+            "words_per_turn": metrics["words_per_turn"],
+            "system_prompt_id": first_prompt_id,
+        })
+
+    messages = pd.DataFrame(
+        message_rows, columns=["conversation_id", "turn", "role", "content", "system_prompt_id", "token_count"]
+    )
+    messages["role"] = messages["role"].astype("category")
+    messages["token_count"] = messages["token_count"].astype("Int64")
+
+    conversations = pd.DataFrame(conversation_rows)
+    metrics = compute_turn_metrics_frame(messages).reindex(conversations["conversation_id"], fill_value=0)
+    for column in TURN_METRIC_NUMERIC_COLUMNS:
+        conversations[column] = metrics[column].to_numpy()
+    return {
+        CONVERSATIONS: conversations,
+        MESSAGES: messages,
+        SYSTEM_PROMPTS: pd.DataFrame(list(prompts.items()), columns=["system_prompt_id", "content"]),
+    }
+
+
+def write_columnar(df, store_dir=DEFAULT_STORE_DIR, append=False):
+    """
+    Writes a processed conversations DataFrame as Parquet tables under `store_dir`
+    (one sub-directory per table). With append=True the rows are added as a new part file and
+    only system prompts that are not stored yet are written; otherwise the store is replaced.
+    """
+    if not append and os.path.isdir(store_dir):
+        for table in TABLES:
+            shutil.rmtree(os.path.join(store_dir, table), ignore_errors=True)
+    if df.empty:
+        return
+
+    tables = to_columnar_tables(df)
+    if append:
+        known = set(read_table(store_dir, SYSTEM_PROMPTS, columns=["system_prompt_id"])["system_prompt_id"])
+        prompts = tables[SYSTEM_PROMPTS]
+        tables[SYSTEM_PROMPTS] = prompts[~prompts["system_prompt_id"].isin(known)]
+
+    part = f"part-{int(df['conversation_id'].min()):09d}.parquet"
+    for table, frame in tables.items():
+        if frame.empty:
+            continue
+        os.makedirs(os.path.join(store_dir, table), exist_ok=True)
+        frame.to_parquet(os.path.join(store_dir, table, part), index=False)
+
+
+def read_table(store_dir, table, columns=None):
+    """
+    Reads one table of the columnar store, optionally only the given `columns`.
+    Returns an empty DataFrame if the table doesn't exist yet.
+    """
+    path = os.path.join(store_dir, table)
+    if not os.path.isdir(path) or not os.listdir(path):
+        return pd.DataFrame(columns=columns)
+    frame = pd.read_parquet(path, columns=columns)
+    sort_by = [column for column in ("conversation_id", "turn") if column in frame.columns]
+    if sort_by:
+        frame = frame.sort_values(sort_by, ignore_index=True)
+    return frame
+
+
+def read_processed_conversations(store_dir=DEFAULT_STORE_DIR):
+    """
+    Rebuilds the nested DataFrame returned by process_conversations from the columnar store,
+    resolving interned system prompts back into the message lists.
+    """
+    conversations = read_table(store_dir, CONVERSATIONS)
+    if conversations.empty:
+        return pd.DataFrame()
+    messages = read_table(store_dir, MESSAGES, columns=["conversation_id", "role", "content", "system_prompt_id"])
+    prompts = read_table(store_dir, SYSTEM_PROMPTS).set_index("system_prompt_id")["content"]
+
+    is_system = messages["system_prompt_id"].notna()
+    contents = messages["content"].astype(object)
+    contents[is_system] = messages.loc[is_system, "system_prompt_id"].map(prompts)
+    messages_by_conversation = {
+        conversation_id: [{"role": role, "content": content} for role, content in zip(group["role"], contents[group.index])]
+        for conversation_id, group in messages.groupby("conversation_id", sort=False)
+    }
+
+    df = pd.DataFrame({
+        "conversation_id": conversations["conversation_id"],
+        "metadata": conversations["metadata"].map(_from_json),
+        "messages": conversations["conversation_id"].map(lambda cid: messages_by_conversation.get(cid, [])),
+        "final_feedback": conversations["final_feedback"],
+        "successful": conversations["successful"],
+        "error_info": conversations["error_info"].map(_from_json),
+        "dialogue_length": conversations["dialogue_length"],
+    })
+    df["turn_metrics"] = [
+        {
+            "turn_count": int(row.turn_count),
+            "user_turns": int(row.user_turns),
+            "assistant_turns": int(row.assistant_turns),
+            "total_words": int(row.dialogue_length),
+            "avg_turn_length": float(row.avg_turn_length),
+            "words_per_turn": [int(count) for count in row.words_per_turn],
+        }
+        for row in conversations.itertuples(index=False)
+    ]
+    for column in TURN_METRIC_NUMERIC_COLUMNS:
+        df[column] = conversations[column]
+    return df
@@ -0,0 +1,142 @@
+# conversation_index.py
+
+import json
+import mmap
+import os
+import pandas as pd
+
+from funcs import is_successful, iter_json_array
+from incremental import DEFAULT_STORE_DIR, prefix_fingerprint, read_jsonl_from_offset, _is_json_array
+
+
+INDEX_COLUMNS = ["conversation_id", "offset", "length", "n_messages", "successful"]
+
+
+def _index_paths(file_path, store_dir):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(store_dir, f"{name}.index.parquet"), os.path.join(store_dir, f"{name}.index.json")
+
+
+def _read_json_array_offsets(file_path):
+    with open(file_path, "r", encoding="utf-8") as f:
+        yield from iter_json_array(f, with_offsets=True)
+
+
+def _scan(file_path, offset, first_id, is_array=False):
+    rows = []
+    located = _read_json_array_offsets(file_path) if is_array else read_jsonl_from_offset(file_path, offset)
+    for conversation_id, (start, end, conv) in enumerate(located, start=first_id):
+        rows.append((
+            conversation_id, start, end - start,
+            len(conv.get("inputs", {}).get("messages", [])),
+            is_successful(conv)[0],
+        ))
+        offset = end
+    return pd.DataFrame(rows, columns=INDEX_COLUMNS), offset
+
+
+def build_index(file_path, store_dir=DEFAULT_STORE_DIR):
+    """
+    Builds (or incrementally extends) the byte-offset index of a JSONL dataset or JSON array: one row per
+    conversation with its byte offset and length in the file, plus lightweight summary columns (n_messages,
+    successful). The index is persisted in `store_dir`; if a JSONL file only grew since the last build, only
+    the appended lines are scanned. JSON arrays are rescanned whenever they change. Returns the index DataFrame.
+    """
+    index_path, state_path = _index_paths(file_path, store_dir)
+    size = os.path.getsize(file_path)
+    is_array = _is_json_array(file_path)
+    index, offset = None, 0
+    if os.path.exists(index_path) and os.path.exists(state_path):
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        if (size >= state["offset"] and (not is_array or state["offset"] == size)
+                and prefix_fingerprint(file_path, state["offset"]) == state["fingerprint"]):
+            index, offset = pd.read_parquet(index_path), state["offset"]
+
+    if index is not None and offset == size:
+        return index
+
+    appended, new_offset = _scan(file_path, offset, len(index) if index is not None else 0, is_array)
+    if is_array:
+        new_offset = size
+    index = appended if index is None else pd.concat([index, appended], ignore_index=True)
+
+    os.makedirs(store_dir, exist_ok=True)
+    index.to_parquet(index_path, index=False)
+    with open(state_path, "w", encoding="utf-8") as f:
+        json.dump({"offset": new_offset, "fingerprint": prefix_fingerprint(file_path, new_offset)}, f)
+    return index
+
+
+class ConversationReader:
+    """
+    Random access to single conversations of a JSONL dataset or JSON array: the file is memory-mapped and
+    only the bytes of the requested conversation are decoded, using the offsets from build_index.
+    Appending to the file keeps the reader valid (new conversations need a new reader); if the mapped
+    bytes are truncated or rewritten, get raises ValueError instead of reading stale offsets.
+    """
+
+    def __init__(self, file_path, index=None):
+        self.file_path = file_path
+        self.index = build_index(file_path) if index is None else index
+        self._locations = dict(zip(
+            self.index["conversation_id"], zip(self.index["offset"], self.index["length"])
+        ))
+        self._file = open(file_path, "rb")
+        # mmap can't map an empty file
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self._locations else None
+        self._size = len(self._mmap) if self._mmap is not None else 0
+        self._fingerprint = prefix_fingerprint(file_path, self._size)
+        self._stat = self._file_stat()
+
+    def _file_stat(self):
+        stat = os.stat(self.file_path)
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def _check_unchanged(self):
+        """
+        Raises ValueError if the mapped bytes of the file changed since the reader was opened. Slicing a
+        mapping past the end of a truncated file kills the process with SIGBUS, so this runs before every read;
+        the fingerprint is only recomputed when the file's size or modification time changed.
+        """
+        stat = self._file_stat()
+        if stat == self._stat:
+            return
+        if stat[1] < self._size or prefix_fingerprint(self.file_path, self._size) != self._fingerprint:
+            raise ValueError(f"{self.file_path} was rewritten since the reader was opened, open a new reader")
+        self._stat = stat
+
+    def __contains__(self, conversation_id):
+        return conversation_id in self._locations
+
+    def __len__(self):
+        return len(self._locations)
+
+    def get(self, conversation_id):
+        """
+        Returns the raw conversation dict; raises KeyError for an unknown conversation_id.
+        """
+        offset, length = self._locations[conversation_id]
+        if offset + length > self._size:
+            raise ValueError(f"The index of {self.file_path} is ahead of the mapped file, open a new reader")
+        self._check_unchanged()
+        return json.loads(self._mmap[offset:offset + length])
+
+    def messages(self, conversation_id):
+        return self.get(conversation_id).get("inputs", {}).get("messages", [])
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __del__(self):
+        # A reader dropped from the dashboard's cache releases its mapping once no session holds it
+        if hasattr(self, "_file"):
+            self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
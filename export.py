@@ -0,0 +1,147 @@
+# export.py
+
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from funcs import read_raw_conversations, is_successful
+
+
+# Excel refuses cells longer than this
+XLSX_MAX_CELL_CHARS = 32767
+
+
+def format_turns(messages):
+    """
+    Transcript lines of a conversation as (role_display, content) pairs, skipping system messages.
+    """
+    turns = []
+    for msg in messages:
+        role = msg.get("role", "").lower()
+        if role == "system":
+            continue
+        role_display = "User" if role == "user" else "Assistant" if role == "assistant" else role.capitalize()
+        turns.append((role_display, msg.get("content", "").strip()))
+    return turns
+
+
+def iter_transcripts(file_path, successful=None):
+    """
+    Streams (conversation_id, turns) straight from the dataset file, one conversation at a time.
+    `successful=True/False` keeps only (non-)successful conversations as flagged by is_successful.
+    """
+    for idx, conv in enumerate(read_raw_conversations(file_path)):
+        if successful is not None and is_successful(conv)[0] != successful:
+            continue
+        yield idx, format_turns(conv.get("inputs", {}).get("messages", []))
+
+
+def write_txt(out_path, transcripts, title=None):
+    with open(out_path, "w", encoding="utf-8") as f:
+        for conv_id, turns in transcripts:
+            f.write(f"----- Conversation {conv_id} -----\n\n")
+            for role_display, content in turns:
+                f.write(f"{role_display}: {content}\n\n")
+            f.write("\n\n")
+
+
+def write_xlsx(out_path, transcripts, title=None):
+    """
+    One row per message, written with openpyxl's write-only mode so rows are flushed to disk as they go.
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title or "Conversations")
+    sheet.append(["conversation_id", "turn", "role", "content"])
+    for conv_id, turns in transcripts:
+        for turn, (role_display, content) in enumerate(turns):
+            sheet.append([conv_id, turn, role_display, content[:XLSX_MAX_CELL_CHARS]])
+    workbook.save(out_path)
+
+
+def write_docx(out_path, transcripts, title=None):
+    """
+    python-docx keeps the whole document in memory, so large exports should be sharded (see export_transcripts).
+    """
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(title or "Conversations", level=1)
+    for conv_id, turns in transcripts:
+        doc.add_heading(f"Conversation {conv_id}", level=2)
+        for role_display, content in turns:
+            doc.add_paragraph(f"{role_display}: {content}")
+        doc.add_paragraph("\n")
+    doc.save(out_path)
+
+
+WRITERS = {
+    "txt": write_txt,
+    "xlsx": write_xlsx,
+    "docx": write_docx,
+}
+
+
+def _shard_path(out_path, index):
+    root, ext = os.path.splitext(out_path)
+    return f"{root}-{index:05d}{ext}"
+
+
+def export_transcripts(file_path, out_path, fmt=None, successful=None, title=None, shard_size=None, n_workers=1):
+    """
+    Exports conversation transcripts from the dataset file to txt, xlsx or docx (`fmt`, by default taken
+    from the extension of `out_path`), without building a DataFrame.
+    With `shard_size`, every `shard_size` conversations go to a separate file (out-00000.docx, ...),
+    which bounds the memory of docx exports and lets `n_workers` processes write shards in parallel.
+    Returns the list of written files.
+    """
+    fmt = fmt or os.path.splitext(out_path)[1].lstrip(".").lower()
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}, expected one of {sorted(WRITERS)}")
+    writer = WRITERS[fmt]
+    transcripts = iter_transcripts(file_path, successful)
+
+    if shard_size is None:
+        writer(out_path, transcripts, title)
+        return [out_path]
+
+    paths = []
+    executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    pending = set()
+    try:
+        while shard := list(islice(transcripts, shard_size)):
+            path = _shard_path(out_path, len(paths))
+            paths.append(path)
+            if executor is None:
+                writer(path, shard, title)
+                continue
+            # Keep at most two shards per worker in flight, so reading doesn't run ahead of writing
+            if len(pending) >= 2 * n_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
+            pending.add(executor.submit(writer, path, shard, title))
+        for future in pending:
+            future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export conversation transcripts to txt, xlsx or docx.")
+    parser.add_argument("out_path", help="output file, the extension selects the format")
+    parser.add_argument("--input", default="dataset_conversations.txt")
+    parser.add_argument("--only", choices=["successful", "non-successful"])
+    parser.add_argument("--title")
+    parser.add_argument("--shard-size", type=int)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    successful = None if args.only is None else args.only == "successful"
+    paths = export_transcripts(args.input, args.out_path, successful=successful, title=args.title,
+                               shard_size=args.shard_size, n_workers=args.workers)
+    print(f"Exported transcripts to {', '.join(paths)}")
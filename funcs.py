@@ -1,14 +1,25 @@
 # funcs.py
 
+import glob
+import gzip
+import hashlib
+import io
 import json
 import os
-import pandas as pd
-import nltk
-from nltk.tokenize import word_tokenize
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 
+import profiling
 
-nltk.download('punkt')
-nltk.download('punkt_tab')
+
+# pandas, numpy and NLTK are imported inside the functions that need them, so `import funcs` stays fast
+# for the app's cold start and for every tokenization worker process.
+# NLTK data used by word_tokenize; it's never downloaded implicitly, run `python funcs.py --setup` once.
+NLTK_RESOURCES = {
+    "punkt_tab": "tokenizers/punkt_tab/english/",
+}
 
 
 def is_successful(conversation, last_n=5, feedback_length_threshold=50):
@@ -34,20 +45,573 @@ def is_successful(conversation, last_n=5, feedback_length_threshold=50):
 
     return False, None
 
-def compute_dialogue_length(messages):
+def compute_dialogue_length(messages, tokenizer="nltk"):
     """
     Compute the total number of words in a conversation's messages,
     excluding messages from the 'system' role.
+    `tokenizer` selects the backend, see TOKENIZER_BACKENDS.
+    """
+    contents = [msg.get("content", "") for msg in dialogue_turns(messages)]
+    return sum(count_tokens(contents, tokenizer=tokenizer))
+
+
+# Messages are grouped into batches of roughly this many characters before being sent
+# to a worker, so one huge message (e.g. the outlier conversation) doesn't stall a batch of small ones.
+TOKENIZE_BATCH_CHARS = 200_000
+
+
+# Approximates the token boundaries of word_tokenize (Treebank rules after Punkt sentence splitting):
+# contractions are split ("do", "n't", "'s"), punctuation is a token of its own,
+# hyphenated words and numbers like 1,000.50 stay whole.
+WORD_TOKEN_PATTERN = re.compile(r"""
+      \w+(?=n't\b)
+    | n't\b
+    | '(?:s|re|ve|ll|d|m)\b
+    | \d+(?:[.,:]\d+)+
+    | \w+(?:[-.]\w+)*
+    | \.\.\.
+    | --
+    | [^\w\s]
+""", re.VERBOSE | re.IGNORECASE)
+
+
+def regex_word_counts(contents):
+    """
+    Fast, vectorized approximation of `len(word_tokenize(content))` for a Series (or list)
+    of message contents. Returns a Series of counts aligned with the input.
+    """
+    import pandas as pd
+
+    contents = pd.Series(contents, dtype=object)
+    return contents.fillna("").astype(str).str.count(WORD_TOKEN_PATTERN).astype(int)
+
+
+def missing_nltk_resources():
+    """
+    Names of the NLTK_RESOURCES not installed locally. Only looks at the NLTK data directories, never the network.
+    """
+    import nltk
+
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+    return missing
+
+
+def download_nltk_resources(download_dir=None):
+    """
+    One-time setup: downloads the missing NLTK_RESOURCES (to `download_dir`, or NLTK's default location).
+    Returns the names of the downloaded resources.
+    """
+    import nltk
+
+    missing = missing_nltk_resources()
+    for name in missing:
+        nltk.download(name, download_dir=download_dir, quiet=True, raise_on_error=True)
+    return missing
+
+
+_word_tokenize = None
+
+
+def _load_word_tokenize():
+    global _word_tokenize
+    if _word_tokenize is None:
+        missing = missing_nltk_resources()
+        if missing:
+            raise LookupError(f"NLTK resources {missing} are not installed; run `python funcs.py --setup` once "
+                              f"(or use tokenizer='regex')")
+        from nltk.tokenize import word_tokenize
+        _word_tokenize = word_tokenize
+    return _word_tokenize
+
+
+def _count_tokens_nltk(contents):
+    word_tokenize = _load_word_tokenize()
+    return [len(word_tokenize(content)) for content in contents]
+
+
+def _count_tokens_regex(contents):
+    return regex_word_counts(contents).tolist()
+
+
+# Token counting backends: name -> function mapping a list of contents to a list of counts.
+# "nltk" is the reference; "regex" is much faster, see tokenizer_report.py for its drift.
+TOKENIZER_BACKENDS = {
+    "nltk": _count_tokens_nltk,
+    "regex": _count_tokens_regex,
+}
+
+
+def _get_token_counter(tokenizer):
+    try:
+        return TOKENIZER_BACKENDS[tokenizer]
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {sorted(TOKENIZER_BACKENDS)}") from None
+
+
+def _split_by_size(contents, max_chars):
+    batch, size = [], 0
+    for content in contents:
+        batch.append(content)
+        size += len(content)
+        if size >= max_chars:
+            yield batch
+            batch, size = [], 0
+    if batch:
+        yield batch
+
+
+def tokenizer_version(tokenizer):
+    """
+    Identifies a tokenizer backend and its version, so cached counts are invalidated when either changes.
+    """
+    _get_token_counter(tokenizer)
+    if tokenizer == "nltk":
+        import nltk
+
+        return f"nltk-{nltk.__version__}"
+    if tokenizer == "regex":
+        return "regex-" + hashlib.sha256(WORD_TOKEN_PATTERN.pattern.encode("utf-8")).hexdigest()[:12]
+    return tokenizer
+
+
+def _tokenize(contents, executor, batch_chars, tokenizer):
+    counter = _get_token_counter(tokenizer)
+    if executor is None:
+        return counter(contents)
+
+    counts = []
+    for batch_counts in executor.map(counter, _split_by_size(contents, batch_chars)):
+        counts.extend(batch_counts)
+    return counts
+
+
+def count_tokens(contents, executor=None, batch_chars=TOKENIZE_BATCH_CHARS, tokenizer="nltk", cache=None):
+    """
+    Tokenizes every content exactly once and returns the token counts in input order.
+    If `executor` (e.g. a ProcessPoolExecutor) is given, batches are spread across its workers;
+    the result is identical to the serial path.
+    If `cache` (a token_cache.TokenCountCache) is given, only contents missing from it are tokenized.
+    """
+    if cache is None:
+        profiling.count("messages_tokenized", len(contents))
+        return _tokenize(contents, executor, batch_chars, tokenizer)
+
+    namespace = tokenizer_version(tokenizer)
+    counts = cache.get_many(contents, namespace)
+    missing = list(dict.fromkeys(content for content, count in zip(contents, counts) if count is None))
+    profiling.count("token_cache_hits", len(contents) - sum(count is None for count in counts))
+    profiling.count("messages_tokenized", len(missing))
+    if missing:
+        computed = dict(zip(missing, _tokenize(missing, executor, batch_chars, tokenizer)))
+        cache.put_many(missing, [computed[content] for content in missing], namespace)
+        counts = [computed[content] if count is None else count for content, count in zip(contents, counts)]
+    return counts
+
+
+def dialogue_turns(messages):
+    """
+    Returns the messages that count as dialogue turns (everything except 'system').
+    """
+    return [msg for msg in messages if msg.get("role", "").lower() != "system"]
+
+
+def compute_turn_metrics(messages, token_counts=None, tokenizer="nltk"):
     """
-    total_words = 0
-    for msg in messages:
-        if msg.get("role", "").lower() == "system":
+    Computes turn metrics for a conversation (system messages are skipped):
+      turn_count, user_turns, assistant_turns, total_words, avg_turn_length, words_per_turn.
+    `token_counts` may hold precomputed word counts for the dialogue turns, in order.
+    """
+    turns = dialogue_turns(messages)
+    if token_counts is None:
+        token_counts = count_tokens([msg.get("content", "") for msg in turns], tokenizer=tokenizer)
+
+    roles = [msg.get("role", "").lower() for msg in turns]
+    turn_count = len(turns)
+    total_words = sum(token_counts)
+    return {
+        "turn_count": turn_count,
+        "user_turns": roles.count("user"),
+        "assistant_turns": roles.count("assistant"),
+        "total_words": total_words,
+        "avg_turn_length": total_words / turn_count if turn_count > 0 else 0,
+        "words_per_turn": list(token_counts)
+    }
+
+
+# Numeric per-conversation turn metrics, precomputed so the dashboard doesn't recompute them per render.
+TURN_METRIC_NUMERIC_COLUMNS = ["turn_count", "user_turns", "assistant_turns", "avg_turn_length", "median_turn_length"]
+
+
+def explode_messages(df, tokenizer="nltk"):
+    """
+    Flattens the nested `messages` column into a message-level frame with columns:
+      conversation_id, turn (index within the conversation), role (lowercase), content, token_count.
+    token_count is taken from turn_metrics.words_per_turn when available, otherwise the dialogue turns
+    are tokenized with `tokenizer`; it is missing (NA) for system messages.
+    """
+    import pandas as pd
+
+    exploded = df[["conversation_id", "messages"]].explode("messages", ignore_index=True)
+    exploded = exploded[exploded["messages"].notna()]
+    messages = pd.DataFrame({
+        "conversation_id": exploded["conversation_id"].to_numpy(),
+        "role": exploded["messages"].str.get("role").fillna("").str.lower().to_numpy(),
+        "content": exploded["messages"].str.get("content").fillna("").to_numpy(),
+    })
+    messages["turn"] = messages.groupby("conversation_id").cumcount()
+
+    is_turn = messages["role"] != "system"
+    if "turn_metrics" in df.columns:
+        counts = df["turn_metrics"].str.get("words_per_turn").explode().dropna().to_numpy()
+    else:
+        counts = count_tokens(messages.loc[is_turn, "content"].tolist(), tokenizer=tokenizer)
+    messages["token_count"] = pd.array([pd.NA] * len(messages), dtype="Int64")
+    messages.loc[is_turn, "token_count"] = pd.array(counts, dtype="Int64")
+    return messages[["conversation_id", "turn", "role", "content", "token_count"]]
+
+
+def compute_turn_metrics_frame(messages):
+    """
+    Vectorized turn metrics over a message-level frame (conversation_id, role, token_count),
+    system messages are skipped. Returns one row per conversation_id with the columns
+    turn_count, user_turns, assistant_turns, total_words, avg_turn_length and median_turn_length.
+    """
+    import pandas as pd
+
+    role = messages["role"].astype(str)
+    turns = pd.DataFrame({
+        "conversation_id": messages["conversation_id"],
+        "is_user": role == "user",
+        "is_assistant": role == "assistant",
+        "token_count": messages["token_count"],
+    })[role != "system"]
+    turns["token_count"] = turns["token_count"].astype("int64")
+
+    metrics = turns.groupby("conversation_id").agg(
+        turn_count=("token_count", "size"),
+        user_turns=("is_user", "sum"),
+        assistant_turns=("is_assistant", "sum"),
+        total_words=("token_count", "sum"),
+        avg_turn_length=("token_count", "mean"),
+        median_turn_length=("token_count", "median"),
+    )
+    # Conversations with only system messages have no turns
+    return metrics.reindex(messages["conversation_id"].unique(), fill_value=0).rename_axis("conversation_id")
+
+
+def add_turn_metric_columns(df, tokenizer="nltk"):
+    """
+    Adds the numeric TURN_METRIC_NUMERIC_COLUMNS to a processed conversations DataFrame.
+    """
+    metrics = compute_turn_metrics_frame(explode_messages(df, tokenizer))
+    metrics = metrics.reindex(df["conversation_id"], fill_value=0)
+    df = df.drop(columns=TURN_METRIC_NUMERIC_COLUMNS, errors="ignore")
+    for column in TURN_METRIC_NUMERIC_COLUMNS:
+        df[column] = metrics[column].to_numpy()
+    return df
+
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Characters read at a time by the incremental JSON array parser
+JSON_ARRAY_CHUNK_CHARS = 1 << 20
+
+_JSON_WHITESPACE = re.compile(r"\s*")
+
+# Characters that can continue a JSON number; a number followed by one of them may be cut by a chunk boundary
+_JSON_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+
+def resolve_dataset_files(path):
+    """
+    The dataset files behind `path`: the file itself, the files of a directory (sorted by name,
+    hidden files skipped) or the files matching a glob pattern (sorted), e.g. "logs/2025-03-*.jsonl.gz".
+    The sorted order defines the global conversation_ids across shards. An existing file is taken
+    as is, even if its name contains glob characters.
+    """
+    if os.path.isfile(path):
+        return [path]
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))
+                 if not name.startswith(".") and os.path.isfile(os.path.join(path, name))]
+    elif any(char in path for char in "*?["):
+        files = sorted(file for file in glob.glob(path, recursive=True) if os.path.isfile(file))
+    else:
+        # Missing file, opening it raises the usual FileNotFoundError
+        return [path]
+    if not files:
+        raise FileNotFoundError(f"No dataset files found for {path!r}")
+    return files
+
+
+def open_dataset_file(file_path):
+    """
+    Opens a dataset file as UTF-8 text, transparently decompressing gzip and zstd files (detected by
+    their magic bytes, not the extension). zstd needs the `zstandard` package.
+    """
+    raw = open(file_path, "rb")
+    magic = raw.peek(4)[:4]
+    if magic.startswith(GZIP_MAGIC):
+        raw.close()
+        stream = gzip.open(file_path, "rb")
+    elif magic == ZSTD_MAGIC:
+        try:
+            import zstandard
+        except ImportError:
+            raw.close()
+            raise ImportError(f"Reading {file_path} needs the zstandard package: pip install zstandard") from None
+        stream = io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    else:
+        stream = raw
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def iter_json_array(f, chunk_chars=JSON_ARRAY_CHUNK_CHARS, with_offsets=False):
+    """
+    Incrementally yields the elements of a JSON array from the text stream `f`, holding roughly one
+    chunk plus the element being decoded in memory instead of the whole document. Only whitespace may
+    follow the closing bracket.
+    With `with_offsets`, yields (start, end, element) with the element's byte offsets in the UTF-8 encoded stream.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    # Byte offset of buffer[mark]; only the text between two elements is encoded to advance it
+    mark, mark_bytes = 0, 0
+    while not buffer and (chunk := f.read(chunk_chars)):
+        buffer = chunk.lstrip()
+        if with_offsets:
+            mark_bytes += len(chunk[:len(chunk) - len(buffer)].encode("utf-8"))
+    if not buffer.startswith("["):
+        raise ValueError("Expected a JSON array")
+    pos, eof, expect_value, first = 1, False, True, True
+    while True:
+        pos = _JSON_WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            char = buffer[pos]
+            if char == "]" and (first or not expect_value):
+                rest = buffer[pos + 1:]
+                while True:
+                    if rest.strip():
+                        raise ValueError("Extra data after JSON array")
+                    if not (rest := f.read(chunk_chars)):
+                        return
+            if not expect_value:
+                if char != ",":
+                    raise ValueError(f"Expected ',' or ']' in JSON array, got {char!r}")
+                pos, expect_value = pos + 1, True
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # A number cut by the end of the buffer (e.g. "1" or "1." of "1.5e10") continues in the next chunk
+                if eof or (end < len(buffer) and buffer[end] not in _JSON_NUMBER_CHARS):
+                    if with_offsets:
+                        start_bytes = mark_bytes + len(buffer[mark:pos].encode("utf-8"))
+                        mark, mark_bytes = end, start_bytes + len(buffer[pos:end].encode("utf-8"))
+                        yield start_bytes, mark_bytes, value
+                    else:
+                        yield value
+                    pos, expect_value, first = end, False, False
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+        elif eof:
+            raise ValueError("Unterminated JSON array")
+        # Read at least as much as is buffered, so an element spanning many chunks is decoded
+        # in a logarithmic number of attempts
+        more = f.read(max(chunk_chars, len(buffer) - pos))
+        eof = not more
+        if with_offsets:
+            mark, mark_bytes = 0, mark_bytes + len(buffer[mark:pos].encode("utf-8"))
+        buffer, pos = buffer[pos:] + more, 0
+
+
+def _read_dataset_file(file_path):
+    with open_dataset_file(file_path) as f:
+        # Determine file type: JSON array vs. JSONL, peeking at the (decompressed) bytes without consuming them
+        if f.buffer.peek(8192).lstrip()[:1] == b"[":
+            yield from iter_json_array(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def read_raw_conversations(file_path):
+    """
+    Lazily yields raw conversation dicts from the dataset: a single file, a directory of shards
+    or a glob pattern (see resolve_dataset_files), each plain, gzip or zstd compressed.
+    JSONL files are parsed line by line and JSON arrays element by element, so only one conversation
+    is held in memory at a time. Shards are read in sorted order.
+    """
+    yield from _read_dataset_files(resolve_dataset_files(file_path))
+
+
+def _read_dataset_files(shard_paths):
+    for shard_path in shard_paths:
+        yield from _read_dataset_file(shard_path)
+
+
+def build_conversation_entry(idx, conv, token_counts=None):
+    """
+    Builds the processed row for a single raw conversation.
+    `token_counts` may hold precomputed word counts for the conversation's dialogue turns.
+    """
+    metadata = conv.get("metadata", {})
+    inputs = conv.get("inputs", {})
+    messages = inputs.get("messages", [])
+    with profiling.stage("is_successful", records=1):
+        success, feedback = is_successful(conv, last_n=5, feedback_length_threshold=50)
+    error_info = metadata.get("error", None)
+    turn_metrics = compute_turn_metrics(messages, token_counts)
+
+    return {
+        "conversation_id": idx,
+        "metadata": metadata,
+        "messages": messages,
+        "final_feedback": feedback,
+        "successful": success,
+        "error_info": error_info,
+        "dialogue_length": turn_metrics["total_words"],
+        "turn_metrics": turn_metrics
+    }
+
+
+def build_conversation_entries(batch, executor, tokenizer="nltk", cache=None):
+    """
+    Builds entries for a batch of (idx, conv) pairs, tokenizing all their dialogue turns in one call.
+    """
+    turns_per_conv = [dialogue_turns(conv.get("inputs", {}).get("messages", [])) for _, conv in batch]
+    contents = [msg.get("content", "") for turns in turns_per_conv for msg in turns]
+    with profiling.stage("tokenize", records=len(contents)):
+        counts = count_tokens(contents, executor, tokenizer=tokenizer, cache=cache)
+
+    entries, start = [], 0
+    with profiling.stage("build_entries", records=len(batch)):
+        for (idx, conv), turns in zip(batch, turns_per_conv):
+            end = start + len(turns)
+            entries.append(build_conversation_entry(idx, conv, counts[start:end]))
+            start = end
+    return entries
+
+
+def _read_batch(raw, batch_size):
+    with profiling.stage("parse") as parse:
+        batch = list(islice(raw, batch_size))
+        parse.records = len(batch)
+    return batch
+
+
+def _iter_batched_entries(conversations, n_workers, batch_size, tokenizer, cache):
+    executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    raw = enumerate(conversations)
+    try:
+        while batch := _read_batch(raw, batch_size):
+            yield from build_conversation_entries(batch, executor, tokenizer, cache)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def _process_shard(shard_path, batch_size, tokenizer, cache_path):
+    """
+    Worker side of the sharded path: parses and processes one shard serially, with its own connection
+    to the token count cache. Returns the entries, with conversation_ids local to the shard, and the
+    worker's cache hits and misses.
+    """
+    from token_cache import TokenCountCache
+
+    cache = TokenCountCache(cache_path) if cache_path else None
+    try:
+        entries = list(_iter_batched_entries(_read_dataset_file(shard_path), 1, batch_size, tokenizer, cache))
+        return entries, (cache.hits, cache.misses) if cache is not None else (0, 0)
+    finally:
+        if cache is not None:
+            cache.close()
+
+
+def _iter_shard_entries(shard_paths, n_workers, batch_size, tokenizer, cache):
+    """
+    Processes shards in parallel, one shard per task, and yields their entries in shard order with
+    conversation_ids renumbered to be global, so the result is the same as reading the shards serially.
+    The workers' token cache hits and misses are added to `cache`, so its stats cover the whole run.
+    """
+    cache_path = cache.path if cache is not None else None
+    executor = ProcessPoolExecutor(max_workers=n_workers)
+    pending = deque()
+    shards = iter(shard_paths)
+    first_id = 0
+    try:
+        while True:
+            # Keep at most two shards per worker in flight, so finished shards don't pile up in memory
+            while len(pending) < 2 * n_workers and (shard_path := next(shards, None)) is not None:
+                pending.append(executor.submit(_process_shard, shard_path, batch_size, tokenizer, cache_path))
+            if not pending:
+                break
+            with profiling.stage("shard_wait"):
+                entries, (hits, misses) = pending.popleft().result()
+            if cache is not None:
+                cache.hits += hits
+                cache.misses += misses
+            for entry in entries:
+                entry["conversation_id"] += first_id
+                yield entry
+            first_id += len(entries)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def iter_conversations(file_path, chunk_size=None, n_workers=1, batch_size=64, tokenizer="nltk", cache=None):
+    """
+    Streams processed conversations from the dataset: a file, a directory of shards or a glob pattern,
+    plain or gzip/zstd compressed (see read_raw_conversations).
+    With chunk_size=None yields one conversation entry (dict) at a time,
+    otherwise yields DataFrames of at most `chunk_size` rows, so large exports
+    can be processed with constant memory.
+    With n_workers > 1, a single file has the messages of `batch_size` conversations at a time tokenized
+    across a process pool, while multiple shards are parsed and processed in parallel, one shard per worker;
+    either way entries come out in order with the same conversation_ids as the serial path.
+    `tokenizer` selects the token counting backend ("nltk" or "regex").
+    `cache` (a token_cache.TokenCountCache) skips tokenizing messages seen in earlier runs.
+    """
+    import pandas as pd
+
+    if chunk_size is not None and chunk_size < 1:
+        raise ValueError("chunk_size must be a positive integer or None")
+    if n_workers < 1:
+        raise ValueError("n_workers must be a positive integer")
+
+    shard_paths = resolve_dataset_files(file_path)
+    if n_workers > 1 and len(shard_paths) > 1:
+        entries = _iter_shard_entries(shard_paths, n_workers, batch_size, tokenizer, cache)
+    else:
+        entries = _iter_batched_entries(_read_dataset_files(shard_paths), n_workers, batch_size, tokenizer, cache)
+
+    chunk = []
+    for entry in entries:
+        if chunk_size is None:
+            yield entry
             continue
-        content = msg.get("content", "")
-        total_words += len(word_tokenize(content))
-    return total_words
+        chunk.append(entry)
+        if len(chunk) >= chunk_size:
+            with profiling.stage("dataframe_build", records=len(chunk)):
+                chunk_df = add_turn_metric_columns(pd.DataFrame(chunk), tokenizer)
+            yield chunk_df
+            chunk = []
 
-def process_conversations(file_path):
+    if chunk:
+        with profiling.stage("dataframe_build", records=len(chunk)):
+            chunk_df = add_turn_metric_columns(pd.DataFrame(chunk), tokenizer)
+        yield chunk_df
+
+
+def process_conversations(file_path, n_workers=1, tokenizer="nltk", cache=None):
     """
     Reads and processes the dataset file.
     Returns a DataFrame with one row per conversation including:
@@ -57,66 +621,65 @@ def process_conversations(file_path):
       - success flag
       - error_info
       - dialogue_length (computed from the messages)
+      - turn_metrics (turn counts and words per turn)
+      - numeric turn metric columns (turn_count, user/assistant turns, avg and median turn length)
+    Thin wrapper over `iter_conversations`; use that directly for large files.
+    `n_workers` sets the size of the tokenization process pool (1 = serial),
+    `tokenizer` the token counting backend and `cache` an optional persistent token count cache.
     """
-    conversations = []
+    import pandas as pd
 
-    # Determine file type: JSON array vs. JSONL
-    with open(file_path, "r", encoding="utf-8") as f:
-        first_char = f.read(1)
-        f.seek(0)
-        if first_char == '[':
-            data = json.load(f)
-        else:
-            data = [json.loads(line) for line in f if line.strip()]
+    with profiling.stage("process_conversations") as process:
+        entries = list(iter_conversations(file_path, n_workers=n_workers, tokenizer=tokenizer, cache=cache))
+        with profiling.stage("dataframe_build", records=len(entries)):
+            df = pd.DataFrame(entries)
+            if not df.empty:
+                df = add_turn_metric_columns(df, tokenizer)
+        process.records = len(df)
 
-    print(f"Total conversations found: {len(data)}")
-
-    for idx, conv in enumerate(data):
-        metadata = conv.get("metadata", {})
-        inputs = conv.get("inputs", {})
-        messages = inputs.get("messages", [])
-        success, feedback = is_successful(conv, last_n=5, feedback_length_threshold=50)
-        error_info = metadata.get("error", None)
-
-        conversation_entry = {
-            "conversation_id": idx,
-            "metadata": metadata,
-            "messages": messages,
-            "final_feedback": feedback,
-            "successful": success,
-            "error_info": error_info,
-            "dialogue_length": compute_dialogue_length(messages)
-        }
-        conversations.append(conversation_entry)
-
-    df = pd.DataFrame(conversations)
+    print(f"Total conversations found: {len(df)}")
     print("Feedback Summary:")
     print(df['final_feedback'].dropna().unique())
     print(f"Successful conversations: {df['successful'].sum()} out of {len(df)}")
+    if cache is not None:
+        print(f"Token cache: {cache.stats()}")
     return df
 
 
-import numpy as np
-import nltk
-from nltk.tokenize import word_tokenize
-
-nltk.download('punkt', quiet=True)
-
-
-def compute_median_dialogue_lengths(df, outlier_conversation_id=0):
+def compute_median_dialogue_lengths(df, outlier_conversation_id=None):
     """
-    Computes the median turn length per conversation, excluding the specified outlier.
+    Computes the median turn length per conversation, excluding outliers.
     Returns a DataFrame with columns:
       'conversation_id' and 'median_turn_length'.
 
     :param df: DataFrame containing conversation data.
-    :param outlier_conversation_id: The conversation_id to drop as outlier.
+    :param outlier_conversation_id: The conversation_id (or list of ids) to drop as outliers.
+        If None, conversations whose dialogue_length is an outlier by the IQR rule are dropped.
     :return: A DataFrame with 'conversation_id' and 'median_turn_length'.
     """
-    # Exclude the outlier conversation (by ID)
-    df_no_outlier = df[df["conversation_id"] != outlier_conversation_id].copy()
+    import numpy as np
+    import pandas as pd
+
+    if outlier_conversation_id is None:
+        if "dialogue_length" in df.columns and "conversation_id" in df.columns:
+            from streaming_stats import StreamingStats
+            length_stats = StreamingStats.from_values(df["dialogue_length"].tolist(), df["conversation_id"].tolist())
+            outlier_conversation_id = [conversation_id for conversation_id, _ in length_stats.outliers()]
+        else:
+            outlier_conversation_id = []
+    elif np.isscalar(outlier_conversation_id):
+        outlier_conversation_id = [outlier_conversation_id]
 
-    if "turn_metrics" in df_no_outlier.columns:
+    # Exclude the outlier conversations (by ID)
+    if "conversation_id" in df.columns:
+        df_no_outlier = df[~df["conversation_id"].isin(outlier_conversation_id)].copy()
+    else:
+        df_no_outlier = df.copy()
+
+    if "median_turn_length" in df_no_outlier.columns:
+        # Precomputed by add_turn_metric_columns / the columnar store
+        df_no_outlier["median_turn_length"] = df_no_outlier["median_turn_length"].astype(int)
+    elif "turn_metrics" in df_no_outlier.columns:
         # Compute median of word counts per turn if turn_metrics/words_per_turn is available
         df_no_outlier["median_turn_length"] = df_no_outlier["turn_metrics"].apply(
             lambda metrics: int(np.median(metrics.get("words_per_turn", [])))
@@ -142,9 +705,38 @@ def compute_median_dialogue_lengths(df, outlier_conversation_id=0):
 
 if __name__ == "__main__":
     # Run the pipeline only when executed directly.
+    import sys
+    from token_cache import TokenCountCache
+
+    if "--setup" in sys.argv:
+        downloaded = download_nltk_resources()
+        print(f"Downloaded NLTK resources: {downloaded}" if downloaded else "NLTK resources already installed")
+        sys.exit(0)
+
+    # --profile prints and saves per-stage timings, --profile-memory also their peak memory
+    if {"--profile", "--profile-memory"} & set(sys.argv) and not profiling.is_enabled():
+        profiling.enable(memory="--profile-memory" in sys.argv)
+
     file_path = 'dataset_conversations.txt'
-    df_conversations = process_conversations(file_path)
+    with TokenCountCache() as cache:
+        if "--incremental" in sys.argv:
+            from incremental import update_processed_conversations
+            df_conversations = update_processed_conversations(file_path, cache=cache)
+        else:
+            df_conversations = process_conversations(file_path, cache=cache)
 
     output_csv = "processed_conversations.csv"
     df_conversations.to_csv(output_csv, index=False)
     print(f"Processed data saved to {output_csv}")
+
+    from columnar import DEFAULT_STORE_DIR, write_columnar
+    write_columnar(df_conversations, DEFAULT_STORE_DIR)
+    print(f"Columnar data saved to {DEFAULT_STORE_DIR}/")
+
+    from search_index import build_search_index
+    search_index = build_search_index(file_path)
+    print(f"Search index covers {len(search_index.messages)} messages")
+
+    if profiling.is_enabled():
+        print(profiling.format_trace(profiling.get_trace()))
+        print(f"Profile trace saved to {profiling.export_json()}")
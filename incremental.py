@@ -0,0 +1,179 @@
+# incremental.py
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+import pandas as pd
+
+from columnar import read_processed_conversations, write_columnar
+from funcs import build_conversation_entries, process_conversations
+from streaming_stats import StreamingStats
+
+
+DEFAULT_STORE_DIR = ".cache"
+
+# Bytes hashed at the start and at the end of the already processed prefix.
+# Hashing both ends catches rewritten files without re-reading the whole prefix.
+FINGERPRINT_BYTES = 64 * 1024
+
+
+def prefix_fingerprint(file_path, offset):
+    """
+    Fingerprint of the first `offset` bytes of the file: hash of its head, its tail and its length.
+    """
+    digest = hashlib.sha256(str(offset).encode("ascii"))
+    with open(file_path, "rb") as f:
+        digest.update(f.read(min(offset, FINGERPRINT_BYTES)))
+        tail_start = max(offset - FINGERPRINT_BYTES, 0)
+        f.seek(tail_start)
+        digest.update(f.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+def read_jsonl_from_offset(file_path, offset=0):
+    """
+    Yields (start_offset, end_offset, conversation) for every complete JSONL line starting at byte `offset`.
+    A trailing line without a newline that doesn't parse yet is treated as still being written
+    and is not yielded.
+    """
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.strip():
+                offset += len(line)
+                continue
+            try:
+                conv = json.loads(line)
+            except json.JSONDecodeError:
+                if line.endswith(b"\n"):
+                    raise
+                break
+            yield offset, offset + len(line), conv
+            offset += len(line)
+
+
+def _is_json_array(file_path):
+    with open(file_path, "rb") as f:
+        return f.read(1) == b"["
+
+
+def _store_paths(file_path, store_dir):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    columnar_dir = os.path.join(store_dir, name)
+    return columnar_dir, os.path.join(columnar_dir, "state.json")
+
+
+def _load_state(state_path):
+    if not os.path.exists(state_path):
+        return None
+    with open(state_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_state(state, state_path):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with open(state_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(state_path + ".tmp", state_path)
+
+
+def _can_resume(file_path, state, tokenizer):
+    if state.get("tokenizer") != tokenizer:
+        return False
+    offset = state.get("offset", 0)
+    if os.path.getsize(file_path) < offset:
+        return False
+    return prefix_fingerprint(file_path, offset) == state.get("fingerprint")
+
+
+def _process_appended(file_path, offset, first_id, tokenizer, cache, n_workers, batch_size=64):
+    """
+    Processes the complete lines after `offset`. Returns (entries, new_offset).
+    """
+    executor = ProcessPoolExecutor(max_workers=n_workers) if n_workers > 1 else None
+    lines = read_jsonl_from_offset(file_path, offset)
+    entries = []
+    try:
+        while batch := list(islice(lines, batch_size)):
+            offset = batch[-1][1]
+            numbered = [(first_id + len(entries) + i, conv) for i, (_, _, conv) in enumerate(batch)]
+            entries.extend(build_conversation_entries(numbered, executor, tokenizer, cache))
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    return entries, offset
+
+
+def refresh_processed_store(file_path, store_dir=DEFAULT_STORE_DIR, tokenizer="nltk", cache=None, n_workers=1):
+    """
+    Incrementally processes an append-only JSONL dataset into a columnar store (see columnar.py).
+    The store keeps the byte offset of the last processed line and a fingerprint of the file up to
+    that offset. On the next call only lines appended since then are parsed, and their rows are written
+    as a new part with consecutive conversation_ids. If the file was rewritten (shorter, or different
+    prefix) the store is rebuilt from scratch; JSON arrays are rebuilt whenever they change.
+    Returns the directory of the columnar store.
+    """
+    columnar_dir, state_path = _store_paths(file_path, store_dir)
+    size = os.path.getsize(file_path)
+    is_array = _is_json_array(file_path)
+
+    state = _load_state(state_path)
+    if (state is not None and "dialogue_length_stats" in state and _can_resume(file_path, state, tokenizer)
+            and (not is_array or state["offset"] == size)):
+        offset, first_id = state["offset"], state["conversations"]
+    else:
+        if state is not None:
+            print("Dataset was rewritten, rebuilding the processed store")
+        state, offset, first_id = None, 0, 0
+
+    if state is not None and offset == size:
+        return columnar_dir
+
+    if is_array:
+        # JSON arrays can't be appended to line by line, always rebuild
+        df = process_conversations(file_path, n_workers=n_workers, tokenizer=tokenizer, cache=cache)
+        new_offset = size
+    else:
+        entries, new_offset = _process_appended(file_path, offset, first_id, tokenizer, cache, n_workers)
+        print(f"Processed {len(entries)} new conversations (bytes {offset}-{new_offset})")
+        if not entries and offset > 0:
+            return columnar_dir
+        df = pd.DataFrame(entries)
+
+    # Dialogue length statistics are updated in the same pass, never re-reading earlier rows
+    length_stats = StreamingStats.from_dict(state["dialogue_length_stats"]) if state else StreamingStats()
+    if not df.empty:
+        length_stats.update(df["dialogue_length"].tolist(), df["conversation_id"].tolist())
+
+    write_columnar(df, columnar_dir, append=offset > 0)
+    _save_state({
+        "offset": new_offset,
+        "fingerprint": prefix_fingerprint(file_path, new_offset),
+        "tokenizer": tokenizer,
+        "conversations": first_id + len(df),
+        "dialogue_length_stats": length_stats.to_dict(),
+    }, state_path)
+    return columnar_dir
+
+
+def load_length_stats(columnar_dir):
+    """
+    Returns the StreamingStats of dialogue lengths maintained by refresh_processed_store
+    for the store in `columnar_dir`, or None if the store hasn't been built yet.
+    """
+    state = _load_state(os.path.join(columnar_dir, "state.json"))
+    if state is None or "dialogue_length_stats" not in state:
+        return None
+    return StreamingStats.from_dict(state["dialogue_length_stats"])
+
+
+def update_processed_conversations(file_path, store_dir=DEFAULT_STORE_DIR, tokenizer="nltk", cache=None,
+                                   n_workers=1):
+    """
+    Refreshes the processed store (see refresh_processed_store) and returns the full processed DataFrame,
+    in the same shape as process_conversations.
+    """
+    columnar_dir = refresh_processed_store(file_path, store_dir, tokenizer, cache, n_workers)
+    return read_processed_conversations(columnar_dir)
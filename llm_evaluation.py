@@ -0,0 +1,256 @@
+# llm_evaluation.py
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+import pandas as pd
+
+from funcs import read_raw_conversations
+
+
+DEFAULT_MODEL = "gpt-4o"
+DEFAULT_CACHE_PATH = os.path.join(".cache", "llm_evaluations.sqlite")
+
+# Same criteria as the 0-10 scale LangChain criteria evaluator in the research notebook
+CRITERIA = {
+    "conciseness": "Is the response short and to the point while still being informative?",
+    "relevance": "Does the response directly address the user's question?",
+    "helpfulness": "Does the response provide meaningful and useful information?",
+    "completeness": "Is the response sufficiently detailed and does it cover all aspects of the query?",
+}
+
+EVALUATION_PROMPT = """You are evaluating an AI coaching assistant.
+Rate the assistant response on each criterion on a scale of 0-10.
+
+Criteria:
+{criteria}
+
+User input:
+{user_input}
+
+Assistant response:
+{ai_response}
+
+Return only JSON with one integer score per criterion and a short "reasoning", e.g.
+{example}"""
+
+
+def build_evaluation_input(conversation):
+    """
+    Picks the last user input and the last assistant response of a conversation (as the notebook did).
+    Returns (user_input, ai_response), or None if there is no assistant response to evaluate.
+    """
+    messages = conversation.get("inputs", {}).get("messages", [])
+    user_messages = [msg.get("content", "") for msg in messages if msg.get("role") == "user"]
+    assistant_messages = [msg.get("content", "") for msg in messages if msg.get("role") == "assistant"]
+    if not assistant_messages:
+        return None
+    return (user_messages[-1] if user_messages else ""), assistant_messages[-1]
+
+
+def build_prompt(user_input, ai_response, criteria=CRITERIA):
+    example = json.dumps({**{name: 7 for name in criteria}, "reasoning": "..."})
+    return EVALUATION_PROMPT.format(
+        criteria="\n".join(f"- {name}: {question}" for name, question in criteria.items()),
+        user_input=user_input,
+        ai_response=ai_response,
+        example=example,
+    )
+
+
+def evaluation_key(prompt, model):
+    """
+    Cache key of one evaluation: the prompt already contains the conversation excerpt and the criteria.
+    """
+    return hashlib.sha256(f"{model}\0{prompt}".encode("utf-8")).hexdigest()
+
+
+def parse_scores(text, criteria=CRITERIA):
+    """
+    Parses the model answer into {"<criterion>_score": float or None, ..., "reasoning": str}.
+    Accepts a JSON object (optionally wrapped in a markdown code block) and falls back to "criterion: 7"
+    lines, also when the answer is JSON but not an object.
+    """
+    clean = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip())
+    try:
+        data = json.loads(clean)
+    except json.JSONDecodeError:
+        data = None
+    if not isinstance(data, dict):
+        data = {}
+        for name in criteria:
+            match = re.search(rf"{name}\W+(\d+(?:\.\d+)?)", text, re.IGNORECASE)
+            if match:
+                data[name] = match.group(1)
+        data["reasoning"] = text
+
+    scores = {}
+    for name in criteria:
+        try:
+            scores[f"{name}_score"] = min(max(float(data.get(name)), 0.0), 10.0)
+        except (TypeError, ValueError):
+            scores[f"{name}_score"] = None
+    scores["reasoning"] = str(data.get("reasoning", ""))
+    return scores
+
+
+class EvaluationCache:
+    """
+    SQLite cache of raw model answers keyed by evaluation_key. Every answer is committed as soon as it
+    arrives, so it doubles as the checkpoint of an interrupted run.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS evaluations (key TEXT PRIMARY KEY, answer TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, key):
+        row = self._conn.execute("SELECT answer FROM evaluations WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, answer):
+        self._conn.execute("INSERT OR REPLACE INTO evaluations (key, answer) VALUES (?, ?)", (key, answer))
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+class RateLimiter:
+    """
+    Spaces out request starts to at most `requests_per_minute`.
+    """
+
+    def __init__(self, requests_per_minute):
+        self._interval = 60.0 / requests_per_minute
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _is_retryable(exc):
+    import openai
+
+    return isinstance(exc, (
+        openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError, openai.InternalServerError,
+    ))
+
+
+def make_llm(model=DEFAULT_MODEL, base_url=None, api_key=None, timeout=60):
+    """
+    LangChain chat model for the evaluations. `base_url` points it at any OpenAI-compatible
+    chat-completions server (e.g. a local fake one in tests). Retries are handled by this module.
+    """
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(model=model, base_url=base_url, api_key=api_key, temperature=0, max_retries=0,
+                      timeout=timeout)
+
+
+async def _call_with_retries(llm, prompt, max_retries, backoff_base, rate_limiter):
+    from langchain_core.messages import HumanMessage
+
+    for attempt in range(max_retries + 1):
+        if rate_limiter is not None:
+            await rate_limiter.wait()
+        try:
+            response = await llm.ainvoke([HumanMessage(content=prompt)])
+            return response.content
+        except Exception as exc:
+            if attempt == max_retries or not _is_retryable(exc):
+                raise
+            # Exponential backoff with jitter
+            await asyncio.sleep(backoff_base * 2 ** attempt * (0.5 + random.random()))
+
+
+async def evaluate_conversations_async(conversations, model=DEFAULT_MODEL, criteria=CRITERIA, concurrency=8,
+                                       requests_per_minute=None, max_retries=5, backoff_base=1.0,
+                                       cache_path=DEFAULT_CACHE_PATH, llm=None, base_url=None, api_key=None):
+    """
+    Evaluates the last assistant response of each conversation against `criteria`, running at most
+    `concurrency` requests at a time (and at most `requests_per_minute`, if given).
+    Failed calls are retried with exponential backoff. Answers are cached by prompt and model,
+    so reruns and resumed runs only call the model for conversations not evaluated yet.
+    Returns a DataFrame with conversation_id, user_input, ai_response, one <criterion>_score column per
+    criterion, reasoning, cached and error.
+    """
+    llm = llm or make_llm(model, base_url, api_key)
+    cache = EvaluationCache(cache_path)
+    semaphore = asyncio.Semaphore(concurrency)
+    rate_limiter = RateLimiter(requests_per_minute) if requests_per_minute else None
+
+    async def evaluate(conversation_id, user_input, ai_response):
+        prompt = build_prompt(user_input, ai_response, criteria)
+        key = evaluation_key(prompt, model)
+        row = {"conversation_id": conversation_id, "user_input": user_input, "ai_response": ai_response}
+        answer = cache.get(key)
+        row["cached"] = answer is not None
+        if answer is None:
+            async with semaphore:
+                try:
+                    answer = await _call_with_retries(llm, prompt, max_retries, backoff_base, rate_limiter)
+                except Exception as exc:
+                    return {**row, **parse_scores("", criteria), "error": repr(exc)}
+        # An answer that can't be parsed fails only its own row, and is not cached so a rerun asks again
+        try:
+            scores = parse_scores(answer, criteria)
+        except Exception as exc:
+            return {**row, **parse_scores("", criteria), "error": repr(exc)}
+        if not row["cached"]:
+            cache.put(key, answer)
+        return {**row, **scores, "error": None}
+
+    tasks = []
+    for conversation_id, conv in enumerate(conversations):
+        evaluation_input = build_evaluation_input(conv)
+        if evaluation_input is not None:
+            tasks.append(evaluate(conversation_id, *evaluation_input))
+    try:
+        rows = await asyncio.gather(*tasks)
+    finally:
+        cache.close()
+    return pd.DataFrame(rows)
+
+
+def evaluate_conversations(conversations, **kwargs):
+    """
+    Synchronous wrapper of evaluate_conversations_async.
+    """
+    return asyncio.run(evaluate_conversations_async(conversations, **kwargs))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate assistant responses with an LLM judge.")
+    parser.add_argument("file_path", nargs="?", default="dataset_conversations.txt")
+    parser.add_argument("--output", default="conversation_evaluation_results.csv")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=float)
+    parser.add_argument("--base-url", help="OpenAI-compatible endpoint, defaults to the OpenAI API")
+    args = parser.parse_args()
+
+    df_evaluation = evaluate_conversations(
+        read_raw_conversations(args.file_path), model=args.model, concurrency=args.concurrency,
+        requests_per_minute=args.requests_per_minute, base_url=args.base_url,
+    )
+    df_evaluation.to_csv(args.output, index=False)
+    print(f"Evaluated {len(df_evaluation)} conversations "
+          f"({df_evaluation['cached'].sum()} from cache, {df_evaluation['error'].notna().sum()} failed)")
+    print(f"Results saved to {args.output}")
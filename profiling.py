@@ -0,0 +1,161 @@
+# profiling.py
+
+import json
+import os
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+
+DEFAULT_TRACE_PATH = os.path.join(".cache", "profile_trace.json")
+
+# CONVERSATION_PROFILE=1 enables profiling at import, CONVERSATION_PROFILE=memory also captures peak memory
+PROFILE_ENV_VAR = "CONVERSATION_PROFILE"
+
+_enabled = False
+_memory = False
+_started_at = None
+_stages = {}
+_counters = {}
+_active = []
+
+
+class _NullStage:
+    """
+    Returned by stage() while profiling is disabled, so instrumented code costs one function call.
+    """
+    records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, name, records):
+        self.name = name
+        self.records = records
+        self._peak = 0
+
+    def __enter__(self):
+        if _memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # The enclosing stage's peak would be lost by reset_peak, keep it
+            if _active:
+                _active[-1]._peak = max(_active[-1]._peak, peak)
+            self._base = current
+            tracemalloc.reset_peak()
+        _active.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        _active.pop()
+        stats = _stages.setdefault(self.name, {"calls": 0, "seconds": 0.0, "records": 0, "peak_memory_mb": None})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        stats["records"] += self.records or 0
+        if _memory:
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            if _active:
+                _active[-1]._peak = max(_active[-1]._peak, peak)
+            stats["peak_memory_mb"] = max(stats["peak_memory_mb"] or 0.0, (peak - self._base) / 2 ** 20)
+        return False
+
+
+def enable(memory=False):
+    """
+    Starts collecting a new trace. With `memory`, tracemalloc records the peak memory of every stage
+    (this slows allocation-heavy code down noticeably).
+    """
+    global _enabled, _memory
+    reset()
+    _enabled, _memory = True, memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled, _memory
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _enabled, _memory = False, False
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    global _started_at
+    _stages.clear()
+    _counters.clear()
+    _started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def stage(name, records=0):
+    """
+    Context manager timing a pipeline stage. Times, calls and `records` (also settable inside the block
+    through the returned object) add up over repeated calls of the same stage. Nested stages are timed
+    inclusively. Work done in worker processes is only seen as the time the caller waits for it.
+    """
+    if not _enabled:
+        return _NULL_STAGE
+    return _Stage(name, records)
+
+
+def count(name, n=1):
+    """
+    Adds `n` to the counter `name`.
+    """
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def get_trace():
+    """
+    The current trace as a JSON-serializable dict: start time, per-stage stats and counters.
+    """
+    return {
+        "started_at": _started_at,
+        "memory": _memory,
+        "stages": [{"stage": name, **stats} for name, stats in _stages.items()],
+        "counters": dict(_counters),
+    }
+
+
+def export_json(path=DEFAULT_TRACE_PATH):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(get_trace(), f, indent=2)
+    return path
+
+
+def load_trace(path=DEFAULT_TRACE_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def format_trace(trace):
+    """
+    Human readable stage table of a trace, slowest stage first.
+    """
+    lines = [f"{'stage':<28} {'calls':>7} {'seconds':>9} {'records':>9} {'peak MB':>9}"]
+    for stats in sorted(trace["stages"], key=lambda stats: -stats["seconds"]):
+        peak = f"{stats['peak_memory_mb']:9.1f}" if stats["peak_memory_mb"] is not None else f"{'':>9}"
+        lines.append(f"{stats['stage']:<28} {stats['calls']:>7} {stats['seconds']:9.3f} {stats['records']:>9} {peak}")
+    for name, value in trace["counters"].items():
+        lines.append(f"{name}: {value}")
+    return "\n".join(lines)
+
+
+if os.environ.get(PROFILE_ENV_VAR):
+    enable(memory=os.environ[PROFILE_ENV_VAR].lower() == "memory")
@@ -0,0 +1,321 @@
+# search_index.py
+
+import os
+import re
+import shutil
+import numpy as np
+import pandas as pd
+
+from funcs import read_raw_conversations
+from incremental import (
+    DEFAULT_STORE_DIR, prefix_fingerprint, read_jsonl_from_offset, _is_json_array, _load_state, _save_state,
+)
+
+
+# Same feedback keywords as the notebook's SUCCESS_FEEDBACK_KEYWORDS
+SUCCESS_FEEDBACK_KEYWORDS = ["very satisfactory", "satisfactory", "neutral", "unsatisfactory", "very unsatisfactory"]
+
+TERM_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'-?"[^"]*"|\S+')
+
+
+def tokenize_terms(text):
+    """
+    Lowercase word terms of a text, in order. Queries are tokenized the same way.
+    """
+    return TERM_PATTERN.findall(text.lower())
+
+
+def _search_dir(file_path, store_dir):
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    return os.path.join(store_dir, f"{name}.search")
+
+
+def _part_paths(index_dir, part):
+    return (os.path.join(index_dir, f"{part['name']}.postings.parquet"),
+            os.path.join(index_dir, f"{part['name']}.messages.parquet"))
+
+
+def _write_part(index_dir, postings, messages):
+    """
+    Writes term-sorted postings and their message rows as a part named after the messages it covers.
+    """
+    part = {
+        "name": f"part-{int(messages['message'].min()):012d}-{int(messages['message'].max()):012d}",
+        "postings": len(postings),
+    }
+    postings_path, messages_path = _part_paths(index_dir, part)
+    postings.to_parquet(postings_path, index=False)
+    messages.to_parquet(messages_path, index=False)
+    return part
+
+
+def _read_part(index_dir, part):
+    postings_path, messages_path = _part_paths(index_dir, part)
+    return pd.read_parquet(postings_path), pd.read_parquet(messages_path)
+
+
+def _merge_parts(index_dir, parts):
+    """
+    Merges the newest part into the one before while that one holds at most twice as many postings,
+    so part sizes grow geometrically: a dataset appended to n times has O(log n) parts, and every
+    posting is rewritten O(log n) times in total instead of on every append.
+    """
+    while len(parts) >= 2 and parts[-2]["postings"] <= 2 * parts[-1]["postings"]:
+        older, newer = _read_part(index_dir, parts[-2]), _read_part(index_dir, parts[-1])
+        # The newer run's positions all come after the older run's, so a stable sort by term keeps
+        # each term's postings ordered by position
+        postings = pd.concat([older[0], newer[0]], ignore_index=True).sort_values(
+            "term", kind="stable", ignore_index=True
+        )
+        messages = pd.concat([older[1], newer[1]], ignore_index=True)
+        parts[-2:] = [_write_part(index_dir, postings, messages)]
+    return parts
+
+
+def _remove_unlisted_parts(index_dir, parts):
+    # Files of merged parts, or of a build interrupted before its state was saved
+    listed = {os.path.basename(path) for part in parts for path in _part_paths(index_dir, part)}
+    for entry in os.listdir(index_dir):
+        if entry.endswith(".parquet") and entry not in listed:
+            os.remove(os.path.join(index_dir, entry))
+
+
+def _index_conversations(conversations, first_id, first_message, first_position):
+    """
+    Postings (term, message, position), message rows (message, conversation_id, turn, role), the next free
+    position and the number of conversations indexed. Positions are global and skip one between messages,
+    so phrases never span two messages. System messages (the shared system prompt) are listed in the message
+    rows but not indexed.
+    """
+    terms, posting_messages, positions, message_rows = [], [], [], []
+    message, position, n_conversations = first_message, first_position, 0
+    for conversation_id, conv in enumerate(conversations, start=first_id):
+        n_conversations += 1
+        for turn, msg in enumerate(conv.get("inputs", {}).get("messages", [])):
+            role = msg.get("role", "").lower()
+            message_rows.append((message, conversation_id, turn, role))
+            if role != "system":
+                message_terms = tokenize_terms(msg.get("content", ""))
+                terms.extend(message_terms)
+                posting_messages.extend([message] * len(message_terms))
+                positions.extend(range(position, position + len(message_terms)))
+                position += len(message_terms) + 1
+            message += 1
+    postings = pd.DataFrame({
+        "term": pd.Series(terms, dtype=object),
+        "message": pd.Series(posting_messages, dtype="int64"),
+        "position": pd.Series(positions, dtype="int64"),
+    })
+    messages = pd.DataFrame(message_rows, columns=["message", "conversation_id", "turn", "role"])
+    return postings, messages, position, n_conversations
+
+
+def build_search_index(file_path, store_dir=DEFAULT_STORE_DIR):
+    """
+    Builds (or incrementally extends) the inverted index of message contents and returns it as a SearchIndex.
+    The index is persisted in `store_dir` as term-sorted parts; like the byte-offset index, only lines
+    appended to a JSONL dataset since the last build are indexed, into a new part (see _merge_parts).
+    JSON arrays are reindexed whenever they change.
+    """
+    index_dir = _search_dir(file_path, store_dir)
+    state_path = os.path.join(index_dir, "state.json")
+    size = os.path.getsize(file_path)
+    is_array = _is_json_array(file_path)
+
+    state = _load_state(state_path)
+    if (state is None or "parts" not in state or size < state["offset"]
+            or prefix_fingerprint(file_path, state["offset"]) != state["fingerprint"]
+            or (is_array and state["offset"] != size)):
+        state = None
+    if state is None:
+        shutil.rmtree(index_dir, ignore_errors=True)
+        state = {"offset": 0, "conversations": 0, "messages": 0, "positions": 0, "parts": []}
+    if state["offset"] == size:
+        return SearchIndex.load(index_dir, state["parts"])
+
+    if is_array:
+        conversations, new_offset = read_raw_conversations(file_path), size
+    else:
+        located = list(read_jsonl_from_offset(file_path, state["offset"]))
+        conversations = [conv for _, _, conv in located]
+        new_offset = located[-1][1] if located else state["offset"]
+
+    postings, messages, next_position, n_conversations = _index_conversations(
+        conversations, state["conversations"], state["messages"], state["positions"]
+    )
+    os.makedirs(index_dir, exist_ok=True)
+    parts = list(state["parts"])
+    if len(messages):
+        # Sorted by term, each term's postings are one contiguous slice of the part ordered by position
+        postings = postings.sort_values(["term", "position"], ignore_index=True)
+        parts = _merge_parts(index_dir, parts + [_write_part(index_dir, postings, messages)])
+    _save_state({
+        "offset": new_offset,
+        "fingerprint": prefix_fingerprint(file_path, new_offset),
+        "conversations": state["conversations"] + n_conversations,
+        "messages": state["messages"] + len(messages),
+        "positions": next_position,
+        "parts": parts,
+    }, state_path)
+    _remove_unlisted_parts(index_dir, parts)
+    return SearchIndex.load(index_dir, parts)
+
+
+class SearchIndex:
+    """
+    Inverted index of message contents with positional postings.
+
+    Query syntax: space separated terms must all occur in the message, "quoted phrases" must occur as
+    consecutive terms, a trailing * matches a prefix (feedback*), a leading - excludes messages containing
+    the term or phrase, and OR separates alternative clauses. Matching is per message and case-insensitive.
+
+    `postings` is a term-sorted DataFrame (term, message, position) or a list of them, one per index part
+    in position order; a term's postings are looked up in every part, so parts are never re-sorted together.
+    """
+
+    def __init__(self, postings, messages):
+        self._parts = []
+        for part in postings if isinstance(postings, list) else [postings]:
+            terms = part["term"].to_numpy(dtype=object)
+            vocabulary, starts = np.unique(terms, return_index=True)
+            ends = np.append(starts[1:], len(terms))
+            self._parts.append((vocabulary, starts, ends, part["message"].to_numpy(), part["position"].to_numpy()))
+        self.vocabulary = (np.unique(np.concatenate([part[0] for part in self._parts])) if self._parts
+                           else np.empty(0, dtype=object))
+        self.messages = messages.sort_values("message", ignore_index=True)
+        # Turn counted from the end of the conversation, for the last_n filter
+        n_messages = self.messages.groupby("conversation_id")["turn"].transform("size")
+        self._turns_from_end = (n_messages - self.messages["turn"]).to_numpy()
+
+    @classmethod
+    def load(cls, index_dir, parts):
+        """
+        Reads the index parts listed in a build state (see build_search_index).
+        """
+        postings, messages = [], []
+        for part in parts:
+            part_postings, part_messages = _read_part(index_dir, part)
+            postings.append(part_postings)
+            messages.append(part_messages)
+        if not messages:
+            messages = [pd.DataFrame(columns=["message", "conversation_id", "turn", "role"])]
+        return cls(postings, pd.concat(messages, ignore_index=True))
+
+    @staticmethod
+    def _concat(arrays):
+        return np.concatenate(arrays) if arrays else np.empty(0, dtype=np.int64)
+
+    def _term_postings(self, term):
+        """
+        Messages and positions of a term's postings, ordered by position.
+        """
+        messages, positions = [], []
+        for vocabulary, starts, ends, part_messages, part_positions in self._parts:
+            i = np.searchsorted(vocabulary, term)
+            if i < len(vocabulary) and vocabulary[i] == term:
+                messages.append(part_messages[starts[i]:ends[i]])
+                positions.append(part_positions[starts[i]:ends[i]])
+        return self._concat(messages), self._concat(positions)
+
+    def _prefix_messages(self, prefix):
+        messages = []
+        for vocabulary, starts, ends, part_messages, _ in self._parts:
+            lo = np.searchsorted(vocabulary, prefix)
+            hi = np.searchsorted(vocabulary, prefix + "\U0010ffff")
+            if lo < hi:
+                messages.append(part_messages[starts[lo]:ends[hi - 1]])
+        return np.unique(self._concat(messages))
+
+    def _phrase_messages(self, terms):
+        messages, positions = self._term_postings(terms[0])
+        keep = np.ones(len(positions), dtype=bool)
+        for offset, term in enumerate(terms[1:], start=1):
+            keep &= np.isin(positions + offset, self._term_postings(term)[1])
+        return np.unique(messages[keep])
+
+    def _item_messages(self, item):
+        if item.startswith('"'):
+            terms = tokenize_terms(item.strip('"'))
+        elif item.endswith("*") and len(item) > 1:
+            return self._prefix_messages(item[:-1].lower())
+        else:
+            terms = tokenize_terms(item)
+        if not terms:
+            return None
+        return self._phrase_messages(terms)
+
+    def _clause_messages(self, items):
+        matched = None
+        excluded = []
+        for item in items:
+            negate = item.startswith("-") and len(item) > 1
+            messages = self._item_messages(item[1:] if negate else item)
+            if messages is None:
+                continue
+            if negate:
+                excluded.append(messages)
+            else:
+                matched = messages if matched is None else np.intersect1d(matched, messages, assume_unique=True)
+        if matched is None:
+            return np.empty(0, dtype=np.int64)
+        for messages in excluded:
+            matched = np.setdiff1d(matched, messages, assume_unique=True)
+        return matched
+
+    def search(self, query, role=None, last_n=None):
+        """
+        Messages matching `query`, as a DataFrame with conversation_id, turn and role.
+        `role` keeps only messages of that role, `last_n` only the last `last_n` messages of each conversation.
+        """
+        clauses, items = [], []
+        for item in QUERY_PATTERN.findall(query):
+            if item == "OR":
+                clauses.append(items)
+                items = []
+            else:
+                items.append(item)
+        clauses.append(items)
+
+        matched = np.empty(0, dtype=np.int64)
+        for clause in clauses:
+            matched = np.union1d(matched, self._clause_messages(clause))
+
+        mask = np.ones(len(matched), dtype=bool)
+        if role is not None:
+            mask &= self.messages["role"].to_numpy()[matched] == role.lower()
+        if last_n is not None:
+            mask &= self._turns_from_end[matched] <= last_n
+        return self.messages.iloc[matched[mask]][["conversation_id", "turn", "role"]].reset_index(drop=True)
+
+    def conversations(self, query, role=None, last_n=None):
+        """
+        Sorted ids of the conversations with at least one message matching `query`.
+        """
+        return sorted(self.search(query, role, last_n)["conversation_id"].unique().tolist())
+
+
+def feedback_keyword_conversations(index, keywords=SUCCESS_FEEDBACK_KEYWORDS, role="user"):
+    """
+    Conversations where a `role` message contains one of the feedback `keywords` (the notebook's keyword filter).
+    """
+    return index.conversations(" OR ".join(f'"{keyword}"' for keyword in keywords), role=role)
+
+
+def feedback_request_conversations(index, last_n=5):
+    """
+    Conversations mentioning feedback in one of their last `last_n` messages, i.e. the candidates
+    of the first is_successful check, without scanning message texts.
+    """
+    return index.conversations("feedback*", last_n=last_n)
+
+
+if __name__ == "__main__":
+    import sys
+
+    file_path = "dataset_conversations.txt"
+    index = build_search_index(file_path)
+    print(f"Indexed {len(index.messages)} messages, {len(index.vocabulary)} distinct terms")
+    for query in sys.argv[1:]:
+        hits = index.search(query)
+        print(f"{query!r}: {len(hits)} messages in {hits['conversation_id'].nunique()} conversations")
@@ -0,0 +1,243 @@
+# streaming_stats.py
+
+import heapq
+import math
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with relative error guarantees (DDSketch):
+    values are counted in logarithmic buckets, so every quantile estimate is within
+    `relative_accuracy` of the true value while memory only grows with log(max / min).
+    Supports non-negative values only.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.zero_count = 0
+        self.bins = {}
+        self.count = 0
+
+    def _index(self, value):
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index):
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value, weight=1):
+        """
+        Adds `value` (a negative weight removes previously added occurrences).
+        """
+        if value < 0:
+            raise ValueError("QuantileSketch only supports non-negative values")
+        if value == 0:
+            self.zero_count += weight
+        else:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + weight
+            if self.bins[index] <= 0:
+                del self.bins[index]
+        self.count += weight
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can only merge sketches with the same relative_accuracy")
+        self.zero_count += other.zero_count
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.count += other.count
+
+    def quantile(self, q):
+        """
+        Estimate of the q-quantile (0 <= q <= 1), or None for an empty sketch.
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self.bins))
+
+    def to_dict(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "bins": {str(index): count for index, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.bins = {int(index): count for index, count in data["bins"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
+
+
+class StreamingStats:
+    """
+    One-pass statistics of a stream of non-negative values (e.g. dialogue lengths):
+    exact count, mean, standard deviation, min and max, approximate percentiles from a QuantileSketch,
+    and robust outlier detection with the IQR rule (values above Q3 + iqr_multiplier * IQR).
+    Only the `track_top` largest values are kept with their keys (e.g. conversation ids),
+    so outliers can be named without materializing the whole column.
+    """
+
+    def __init__(self, relative_accuracy=0.01, iqr_multiplier=1.5, track_top=1000):
+        self.iqr_multiplier = iqr_multiplier
+        self.track_top = track_top
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.min = None
+        self.max = None
+        self._top = []  # min-heap of (value, key)
+
+    @classmethod
+    def from_values(cls, values, keys=None, **kwargs):
+        stats = cls(**kwargs)
+        stats.update(values, keys)
+        return stats
+
+    def add(self, value, key=None):
+        if key is None:
+            key = self.count
+        self.sketch.add(value)
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        if len(self._top) < self.track_top:
+            heapq.heappush(self._top, (value, key))
+        elif value > self._top[0][0]:
+            heapq.heapreplace(self._top, (value, key))
+
+    def update(self, values, keys=None):
+        if keys is None:
+            keys = [None] * len(values)
+        for value, key in zip(values, keys):
+            self.add(value, key)
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+        for bound, pick in (("min", min), ("max", max)):
+            values = [v for v in (getattr(self, bound), getattr(other, bound)) if v is not None]
+            setattr(self, bound, pick(values) if values else None)
+        self._top = heapq.nlargest(self.track_top, self._top + other._top)
+        heapq.heapify(self._top)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def std(self):
+        if not self.count:
+            return None
+        return math.sqrt(max(self.total_sq / self.count - self.mean ** 2, 0.0))
+
+    def quantile(self, q):
+        value = self.sketch.quantile(q)
+        if value is None:
+            return None
+        # Clamp the bucket estimate to the exact range seen
+        return min(max(value, self.min), self.max)
+
+    @property
+    def median(self):
+        return self.quantile(0.5)
+
+    def percentiles(self, qs=(0.25, 0.5, 0.75, 0.9, 0.99)):
+        return {q: self.quantile(q) for q in qs}
+
+    def fences(self):
+        """
+        IQR fences (Q1 - k * IQR, Q3 + k * IQR), or (None, None) if there are no values.
+        """
+        if not self.count:
+            return None, None
+        q1, q3 = self.quantile(0.25), self.quantile(0.75)
+        iqr = q3 - q1
+        return q1 - self.iqr_multiplier * iqr, q3 + self.iqr_multiplier * iqr
+
+    def outliers(self):
+        """
+        (key, value) pairs above the upper fence, largest first. Limited to the `track_top` largest values.
+        """
+        _, upper = self.fences()
+        if upper is None:
+            return []
+        return [(key, value) for value, key in sorted(self._top, reverse=True) if value > upper]
+
+    def without_outliers(self):
+        """
+        A copy of these statistics with the detected outliers removed.
+        """
+        outliers = self.outliers()
+        stats = StreamingStats.from_dict(self.to_dict())
+        for _, value in outliers:
+            stats.sketch.add(value, weight=-1)
+            stats.count -= 1
+            stats.total -= value
+            stats.total_sq -= value * value
+        stats._top = [(value, key) for value, key in self._top if (key, value) not in outliers]
+        heapq.heapify(stats._top)
+        if outliers:
+            stats.max = max(stats._top)[0] if stats._top else stats.sketch.quantile(1)
+        return stats
+
+    def summary(self):
+        lower, upper = self.fences()
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min,
+            "max": self.max,
+            **{f"p{round(q * 100)}": value for q, value in self.percentiles().items()},
+            "upper_fence": upper,
+            "outliers": len(self.outliers()),
+        }
+
+    def to_dict(self):
+        return {
+            "iqr_multiplier": self.iqr_multiplier,
+            "track_top": self.track_top,
+            "sketch": self.sketch.to_dict(),
+            "count": self.count,
+            "total": self.total,
+            "total_sq": self.total_sq,
+            "min": self.min,
+            "max": self.max,
+            "top": [[value, key] for value, key in self._top],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = QuantileSketch.from_dict(data["sketch"])
+        stats = cls(sketch.relative_accuracy, data["iqr_multiplier"], data["track_top"])
+        stats.sketch = sketch
+        stats.count = data["count"]
+        stats.total = data["total"]
+        stats.total_sq = data["total_sq"]
+        stats.min = data["min"]
+        stats.max = data["max"]
+        stats._top = [(value, key) for value, key in data["top"]]
+        heapq.heapify(stats._top)
+        return stats
@@ -0,0 +1,170 @@
+# success_heuristics.py
+
+import argparse
+from itertools import product
+import numpy as np
+import pandas as pd
+
+from funcs import read_raw_conversations
+
+
+# Parameters of is_successful as used by the pipeline
+DEFAULT_LAST_N = 5
+DEFAULT_FEEDBACK_LENGTH_THRESHOLD = 50
+DEFAULT_KEYWORDS = ("feedback",)
+
+
+def read_message_table(file_path):
+    """
+    Message-level table (conversation_id, turn, role, content) of the raw dataset, roles lowercased,
+    and the ids of all conversations, including those without messages (which have no rows).
+    A processed DataFrame can be flattened the same way with explode_messages.
+    """
+    rows = []
+    n_conversations = 0
+    for idx, conv in enumerate(read_raw_conversations(file_path)):
+        n_conversations += 1
+        for turn, msg in enumerate(conv.get("inputs", {}).get("messages", [])):
+            rows.append((idx, turn, msg.get("role", "").lower(), msg.get("content", "")))
+    messages = pd.DataFrame(rows, columns=["conversation_id", "turn", "role", "content"])
+    return messages, np.arange(n_conversations)
+
+
+class SuccessHeuristic:
+    """
+    Vectorized is_successful over a message-level table (conversation_id, turn, role, content).
+    The per-message columns are computed once, every (last_n, threshold, keywords) configuration
+    then only needs a few per-conversation minima: a keyword must occur within the last `last_n`
+    messages, and the last short user message within them is the feedback.
+    With `max_last_n`, only the last `max_last_n` messages of each conversation are kept for the string
+    work, which is where the time goes on long conversations; larger last_n values are then rejected.
+    Conversations without messages have no rows, so pass all ids as `conversation_ids` (see read_message_table)
+    to have them evaluated too, as unsuccessful like is_successful does.
+    """
+
+    def __init__(self, messages, max_last_n=None, conversation_ids=None):
+        messages = messages.sort_values(["conversation_id", "turn"], ignore_index=True)
+        message_ids = messages["conversation_id"].to_numpy()
+        self.conversation_ids = (np.unique(message_ids) if conversation_ids is None
+                                 else np.union1d(message_ids, np.asarray(conversation_ids)))
+        codes = np.searchsorted(self.conversation_ids, message_ids)
+        self._n_messages = np.bincount(codes, minlength=len(self.conversation_ids))
+        position = messages.groupby("conversation_id").cumcount().to_numpy()
+        # 1 for the last message of a conversation, 2 for the one before, ...
+        from_end = self._n_messages[codes] - position
+        self.max_last_n = max_last_n
+        if max_last_n is not None:
+            keep = from_end <= max_last_n
+            messages, codes, from_end = messages[keep], codes[keep], from_end[keep]
+        self._codes = codes
+        self._from_end = from_end
+        # Plain str methods over a list beat the pandas string accessor on these short substring checks
+        content = messages["content"].fillna("").tolist()
+        self._lower = [text.lower() for text in content]
+        self._stripped = np.array([text.strip() for text in content], dtype=object)
+        self._stripped_len = np.fromiter((len(text) for text in self._stripped), dtype=np.int64,
+                                         count=len(self._stripped))
+        self._is_user = (messages["role"].astype(str).str.lower() == "user").to_numpy()
+        self._keyword_cache = {}
+
+    def _min_from_end(self, mask):
+        """
+        Per conversation, the smallest from-end position among the masked messages (inf if none).
+        """
+        minima = np.full(len(self.conversation_ids), np.inf)
+        np.minimum.at(minima, self._codes[mask], self._from_end[mask])
+        return minima
+
+    def _keyword_mask(self, keyword):
+        keyword = keyword.lower()
+        if keyword not in self._keyword_cache:
+            self._keyword_cache[keyword] = np.fromiter((keyword in text for text in self._lower), dtype=bool,
+                                                       count=len(self._lower))
+        return self._keyword_cache[keyword]
+
+    def _keyword_min_from_end(self, keywords):
+        mask = np.zeros(len(self._codes), dtype=bool)
+        for keyword in keywords:
+            mask |= self._keyword_mask(keyword)
+        return self._min_from_end(mask)
+
+    def _last_candidates(self, feedback_length_threshold):
+        """
+        Per conversation, the from-end position and the text of the last short user message.
+        """
+        mask = self._is_user & (self._stripped_len < feedback_length_threshold)
+        rows = np.flatnonzero(mask)
+        # Messages are sorted by turn, so the last row per conversation is its last candidate
+        last_rows = rows[np.append(self._codes[rows][1:] != self._codes[rows][:-1], True)] if len(rows) else rows
+        min_from_end = np.full(len(self.conversation_ids), np.inf)
+        min_from_end[self._codes[last_rows]] = self._from_end[last_rows]
+        feedback = np.full(len(self.conversation_ids), None, dtype=object)
+        feedback[self._codes[last_rows]] = self._stripped[last_rows]
+        return min_from_end, feedback
+
+    def _check_last_n(self, last_n):
+        if last_n < 1:
+            raise ValueError("last_n must be at least 1")
+        if self.max_last_n is not None and last_n > self.max_last_n:
+            raise ValueError(f"last_n={last_n} exceeds max_last_n={self.max_last_n}")
+
+    def _flags(self, last_n, keyword_min, candidate_min):
+        return (self._n_messages >= 3) & (keyword_min <= last_n) & (candidate_min <= last_n)
+
+    def evaluate(self, last_n=DEFAULT_LAST_N, feedback_length_threshold=DEFAULT_FEEDBACK_LENGTH_THRESHOLD,
+                 keywords=DEFAULT_KEYWORDS):
+        """
+        Success flag and feedback message of every conversation, as a DataFrame indexed by conversation_id
+        with columns successful and final_feedback. With the default parameters this equals is_successful.
+        """
+        self._check_last_n(last_n)
+        candidate_min, feedback = self._last_candidates(feedback_length_threshold)
+        successful = self._flags(last_n, self._keyword_min_from_end(keywords), candidate_min)
+        index = pd.Index(self.conversation_ids, name="conversation_id")
+        return pd.DataFrame({
+            "successful": successful,
+            # Object dtype keeps None (not NaN) for conversations without feedback, like is_successful
+            "final_feedback": pd.Series(np.where(successful, feedback, None), index=index, dtype=object),
+        }, index=index)
+
+    def sweep(self, last_ns, feedback_length_thresholds, keyword_sets):
+        """
+        Evaluates every (last_n, feedback_length_threshold, keywords) combination and returns a sensitivity
+        table with the number and rate of successful conversations per configuration, and how many
+        conversations flip compared to the default configuration.
+        """
+        for last_n in last_ns:
+            self._check_last_n(last_n)
+        default_candidates, _ = self._last_candidates(DEFAULT_FEEDBACK_LENGTH_THRESHOLD)
+        default_flags = self._flags(DEFAULT_LAST_N, self._keyword_min_from_end(DEFAULT_KEYWORDS), default_candidates)
+        candidates = {threshold: self._last_candidates(threshold)[0] for threshold in feedback_length_thresholds}
+        keyword_minima = {tuple(keywords): self._keyword_min_from_end(keywords) for keywords in keyword_sets}
+
+        rows = []
+        for keywords, threshold, last_n in product(keyword_sets, feedback_length_thresholds, last_ns):
+            flags = self._flags(last_n, keyword_minima[tuple(keywords)], candidates[threshold])
+            rows.append({
+                "last_n": last_n,
+                "feedback_length_threshold": threshold,
+                "keywords": ", ".join(keywords),
+                "successful": int(flags.sum()),
+                "success_rate": float(flags.mean()) if len(flags) else 0.0,
+                "flipped_vs_default": int((flags != default_flags).sum()),
+            })
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sensitivity of the success heuristic to its parameters.")
+    parser.add_argument("file_path", nargs="?", default="dataset_conversations.txt")
+    parser.add_argument("--last-n", type=int, nargs="+", default=[3, 5, 7, 10])
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[30, 50, 80, 120])
+    parser.add_argument("--keywords", nargs="+", action="append",
+                        help="a keyword set, can be repeated (default: feedback)")
+    args = parser.parse_args()
+
+    messages, conversation_ids = read_message_table(args.file_path)
+    heuristic = SuccessHeuristic(messages, max_last_n=max(args.last_n + [DEFAULT_LAST_N]),
+                                 conversation_ids=conversation_ids)
+    table = heuristic.sweep(args.last_n, args.thresholds, args.keywords or [list(DEFAULT_KEYWORDS)])
+    print(table.to_string(index=False))
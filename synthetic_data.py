@@ -0,0 +1,119 @@
+# synthetic_data.py
+
+import argparse
+import json
+import os
+import random
+
+
+OPENERS = [
+    "Prepare for a difficult conversation I am going to have",
+    "Review a difficult conversation I already had",
+    "I need help giving feedback to a team member",
+]
+
+VOCABULARY = (
+    "team member manager client project deadline feedback conversation meeting trust goal "
+    "feel think worry respect value expectation concern situation colleague leader role "
+    "performance behaviour change decision responsibility support priority budget plan "
+    "understand explain listen share agree disagree clarify prepare approach perspective "
+    "the a to and of in that it is was we they I you my our with for about when because "
+    "but not always never really maybe very so just also still"
+).split()
+
+FEEDBACK_REPLIES = [
+    "thanks!", "good night!", "extremely helpful", "no", "no thank you",
+    "Nothing comes to mind right now.", "it was fine", "very satisfactory", "helpful, thanks",
+]
+
+FEEDBACK_REQUEST = (
+    "I'm glad this helped! Before we finish, could you share some feedback on how you felt "
+    "interacting with me today?"
+)
+
+QUOTA_ERROR = "429 You exceeded your current quota, please check your plan and billing details."
+
+
+def _sentence(rng, n_words):
+    words = [rng.choice(VOCABULARY) for _ in range(n_words)]
+    words[0] = words[0].capitalize()
+    text = " ".join(words)
+    # Sprinkle in punctuation so tokenizers have something to split
+    return text + rng.choice([".", ".", "?", "!"]) if rng.random() < 0.9 else text + ", right?"
+
+
+def _message_text(rng, mean_words):
+    n_words = max(1, int(rng.lognormvariate(0, 0.6) * mean_words))
+    sentences = []
+    while n_words > 0:
+        length = min(n_words, rng.randint(6, 18))
+        sentences.append(_sentence(rng, length))
+        n_words -= length
+    return " ".join(sentences)
+
+
+def generate_conversation(rng, system_prompt, outlier_rate=0.002, success_rate=0.4):
+    """
+    Generates one conversation in the dataset schema (metadata / inputs.messages / outputs).
+    The number of turns is log-normally distributed; with probability `outlier_rate` the conversation
+    is a pathological loop like the real outlier (repeated opener and quota errors, tens of thousands of words).
+    """
+    opener = rng.choice(OPENERS)
+    messages = [{"role": "system", "content": system_prompt}, {"role": "user", "content": opener}]
+
+    if rng.random() < outlier_rate:
+        for _ in range(rng.randint(400, 700)):
+            messages.append({"role": "assistant", "content": rng.choice([QUOTA_ERROR, _message_text(rng, 90)])})
+            messages.append({"role": "user", "content": opener})
+    else:
+        for _ in range(max(2, int(rng.lognormvariate(2.4, 0.5)))):
+            messages.append({"role": "assistant", "content": _message_text(rng, 70)})
+            messages.append({"role": "user", "content": _message_text(rng, 25)})
+
+    if rng.random() < success_rate:
+        messages.append({"role": "assistant", "content": FEEDBACK_REQUEST})
+        messages.append({"role": "user", "content": rng.choice(FEEDBACK_REPLIES)})
+
+    return {
+        "metadata": {"dataset_split": ["base"], "ls_model_type": "chat"},
+        "inputs": {"messages": messages},
+        "outputs": {"message": {"role": "assistant", "content": _message_text(rng, 30)}},
+    }
+
+
+def _load_system_prompt(system_prompt_path):
+    if system_prompt_path and os.path.exists(system_prompt_path):
+        with open(system_prompt_path, "r", encoding="utf-8") as f:
+            return f.read()
+    return "You are a coach specialized in difficult conversations."
+
+
+def generate_conversations(n, seed=0, system_prompt_path="system_prompt.txt", **kwargs):
+    """
+    Lazily yields `n` synthetic conversations; the same seed always yields the same data.
+    """
+    rng = random.Random(seed)
+    system_prompt = _load_system_prompt(system_prompt_path)
+    for _ in range(n):
+        yield generate_conversation(rng, system_prompt, **kwargs)
+
+
+def write_dataset(file_path, n, seed=0, **kwargs):
+    """
+    Writes `n` synthetic conversations as JSONL to `file_path`, one conversation at a time.
+    """
+    with open(file_path, "w", encoding="utf-8") as f:
+        for conv in generate_conversations(n, seed, **kwargs):
+            f.write(json.dumps(conv, ensure_ascii=False) + "\n")
+    return file_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic coaching conversations dataset (JSONL).")
+    parser.add_argument("file_path")
+    parser.add_argument("-n", type=int, default=1000, help="number of conversations")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_dataset(args.file_path, args.n, args.seed)
+    print(f"Wrote {args.n} conversations to {args.file_path}")
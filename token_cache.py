@@ -0,0 +1,124 @@
+# token_cache.py
+
+import hashlib
+import os
+import sqlite3
+import time
+
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "token_counts.sqlite")
+
+# SQLite limits the number of bound parameters per statement.
+_SQL_BATCH = 500
+
+
+def content_key(content, namespace):
+    """
+    Content-addressed key of a message: hash of the tokenizer namespace (name + version) and the content.
+    """
+    digest = hashlib.sha256()
+    digest.update(namespace.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(content.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class TokenCountCache:
+    """
+    Persistent on-disk (SQLite) cache of per-message token counts, keyed by content hash
+    and tokenizer version. Holds at most `max_entries` rows, evicting the least recently used ones.
+    `hits` and `misses` count lookups since the cache was opened.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=1_000_000):
+        if max_entries < 1:
+            raise ValueError("max_entries must be a positive integer")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_counts ("
+            " key TEXT PRIMARY KEY, count INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON token_counts (last_used)")
+        self._conn.commit()
+
+    def get_many(self, contents, namespace):
+        """
+        Looks up token counts for `contents`. Returns a list aligned with `contents`
+        holding the cached count or None for a miss.
+        """
+        keys = [content_key(content, namespace) for content in contents]
+        found = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), _SQL_BATCH):
+            batch = unique_keys[start:start + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, count FROM token_counts WHERE key IN ({placeholders})", batch
+            )
+            found.update(rows)
+
+        if found:
+            now = time.time_ns()
+            self._conn.executemany(
+                "UPDATE token_counts SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+            )
+            self._conn.commit()
+
+        counts = [found.get(key) for key in keys]
+        hits = sum(count is not None for count in counts)
+        self.hits += hits
+        self.misses += len(counts) - hits
+        return counts
+
+    def put_many(self, contents, counts, namespace):
+        """
+        Stores token counts for `contents`, then evicts the least recently used entries above `max_entries`.
+        """
+        now = time.time_ns()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO token_counts (key, count, last_used) VALUES (?, ?, ?)",
+            [(content_key(content, namespace), int(count), now) for content, count in zip(contents, counts)],
+        )
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM token_counts WHERE key IN"
+                " (SELECT key FROM token_counts ORDER BY last_used LIMIT ?)",
+                (overflow,),
+            )
+        self._conn.commit()
+
+    def stats(self):
+        """
+        Returns hit/miss counters and the current number of entries.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def clear(self):
+        self._conn.execute("DELETE FROM token_counts")
+        self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM token_counts").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
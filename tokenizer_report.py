@@ -0,0 +1,67 @@
+# tokenizer_report.py
+
+import argparse
+import numpy as np
+import pandas as pd
+
+from funcs import read_raw_conversations, dialogue_turns, count_tokens
+
+
+def tokenizer_drift_report(file_path, tokenizer="regex", reference="nltk"):
+    """
+    Compares the token counts of `tokenizer` against `reference` on every dialogue turn of the dataset.
+    Returns a tuple (summary, per_conversation):
+      - summary: dict with message- and conversation-level error statistics
+      - per_conversation: DataFrame with conversation_id, reference/candidate lengths and their difference
+    """
+    conversation_ids, reference_counts, candidate_counts = [], [], []
+    for idx, conv in enumerate(read_raw_conversations(file_path)):
+        contents = [msg.get("content", "") for msg in dialogue_turns(conv.get("inputs", {}).get("messages", []))]
+        conversation_ids.extend([idx] * len(contents))
+        reference_counts.extend(count_tokens(contents, tokenizer=reference))
+        candidate_counts.extend(count_tokens(contents, tokenizer=tokenizer))
+
+    messages = pd.DataFrame({
+        "conversation_id": conversation_ids,
+        "reference": reference_counts,
+        "candidate": candidate_counts,
+    })
+    messages["diff"] = messages["candidate"] - messages["reference"]
+
+    per_conversation = messages.groupby("conversation_id")[["reference", "candidate", "diff"]].sum().reset_index()
+    per_conversation["relative_error"] = (
+        per_conversation["diff"] / per_conversation["reference"].replace(0, np.nan)
+    ).fillna(0.0)
+
+    abs_diff = messages["diff"].abs()
+    abs_rel = per_conversation["relative_error"].abs()
+    total_reference = int(messages["reference"].sum())
+    summary = {
+        "tokenizer": tokenizer,
+        "reference": reference,
+        "messages": len(messages),
+        "conversations": len(per_conversation),
+        "reference_tokens": total_reference,
+        "candidate_tokens": int(messages["candidate"].sum()),
+        "total_relative_drift": float(messages["diff"].sum() / total_reference) if total_reference else 0.0,
+        "message_exact_match_rate": float((abs_diff == 0).mean()) if len(messages) else 1.0,
+        "message_mean_abs_error": float(abs_diff.mean()) if len(messages) else 0.0,
+        "message_p95_abs_error": float(abs_diff.quantile(0.95)) if len(messages) else 0.0,
+        "message_max_abs_error": int(abs_diff.max()) if len(messages) else 0,
+        "conversation_mean_abs_relative_error": float(abs_rel.mean()) if len(per_conversation) else 0.0,
+        "conversation_max_abs_relative_error": float(abs_rel.max()) if len(per_conversation) else 0.0,
+    }
+    return summary, per_conversation
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report how far a fast tokenizer backend drifts from NLTK.")
+    parser.add_argument("file_path", nargs="?", default="dataset_conversations.txt")
+    parser.add_argument("--tokenizer", default="regex")
+    parser.add_argument("--reference", default="nltk")
+    args = parser.parse_args()
+
+    summary, per_conversation = tokenizer_drift_report(args.file_path, args.tokenizer, args.reference)
+    for key, value in summary.items():
+        print(f"{key}: {value}")
+    print(per_conversation.to_string(index=False))